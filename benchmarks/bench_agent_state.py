@@ -0,0 +1,116 @@
+"""
+Memory and time of carrying resource centers through the workflow state.
+
+Compares the old state (``SELECT *`` dict rows with datetimes, media paths
+duplicated at the top level) with the current AgentState built from
+db.records. Each of the six graph nodes is simulated the way LangGraph
+handles a pydantic state: the model is rebuilt from its field values.
+
+    python -m benchmarks.bench_agent_state --centers 500
+"""
+import argparse
+import datetime
+import time
+import tracemalloc
+from typing import Any, Dict, List, Optional
+
+from pydantic import BaseModel
+
+from core.agents import AgentState
+from db.records import Allocation, ResourceCenter
+
+NODES = 6
+
+
+class LegacyAgentState(BaseModel):
+    input: Optional[Dict[str, Any]] = None
+    image_path: Optional[str] = None
+    voice_path: Optional[str] = None
+    request: Optional[Dict[str, Any]] = None
+    image_description: Optional[str] = None
+    voice_description: Optional[str] = None
+    status: Optional[str] = "pending"
+    available_resources: Optional[List[Dict[str, Any]]] = None
+    allocated_resources: Optional[dict] = None
+    disaster_status: Optional[str] = "PENDING"
+    user_msg: Optional[str] = None
+
+
+def make_request() -> dict:
+    return {
+        "request_id": 1, "disaster": "Flood", "disaster_id": 3, "disaster_status": "high",
+        "location": [6.9271, 79.8612], "affected_count": 40, "contact_info": "0771234567",
+        "image_path": "uploads/flood.jpg", "voice_path": None, "text_description": "Water rising fast",
+    }
+
+
+def legacy_row(i: int) -> dict:
+    now = datetime.datetime(2025, 9, 1, 8, 30)
+    return {
+        "id": i, "resourceId": i, "name": f"Center {i}", "address": f"{i} Main Street",
+        "contact": "0112345678", "count": 500, "used": 120, "lat": 6.9 + i * 1e-4,
+        "long": 79.8 + i * 1e-4, "type": "food", "createdAt": now, "updatedAt": now,
+        "distance": 1234.5 + i,
+    }
+
+
+def legacy_state(centers: int) -> LegacyAgentState:
+    request = make_request()
+    return LegacyAgentState(
+        input={"message": "Request Id: 1 ..."},
+        image_path=request["image_path"],
+        voice_path=request["voice_path"],
+        request=request,
+        available_resources=[legacy_row(i) for i in range(centers)],
+        allocated_resources={"request_id": 1, "resource_center_ids": [1, 2], "quantities": [10, 5]},
+    )
+
+
+def current_state(centers: int) -> AgentState:
+    return AgentState(
+        input={"message": "Request Id: 1 ..."},
+        request=make_request(),
+        available_resources=[
+            ResourceCenter(i, i, 500, 120, 6.9 + i * 1e-4, 79.8 + i * 1e-4, 1234.5 + i)
+            for i in range(centers)
+        ],
+        allocated_resources=[Allocation(1, 1, 10), Allocation(1, 2, 5)],
+    )
+
+
+def run_workflow(state: BaseModel) -> BaseModel:
+    schema = type(state)
+    for _ in range(NODES):
+        state = schema(**{name: getattr(state, name) for name in schema.model_fields})
+    return state
+
+
+def measure(label: str, build, centers: int, repeat: int):
+    tracemalloc.start()
+    state = build(centers)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        run_workflow(build(centers))
+    elapsed = (time.perf_counter() - start) / repeat
+
+    payload = len(state.model_dump_json())
+    print(f"{label:<8} centers={centers:<5} build_peak={peak / 1024:8.1f} KiB "
+          f"workflow={elapsed * 1000:8.2f} ms  json={payload / 1024:8.1f} KiB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--centers", type=int, nargs="+", default=[100, 500, 1000])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    for centers in args.centers:
+        measure("legacy", legacy_state, centers, args.repeat)
+        measure("records", current_state, centers, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""
+Verification's DB query time on disaster_requests as the table grows.
+
+Verification counts nearby reports from the hotspot index, which reads
+MySQL only through SELECT_REQUESTS_FOR_DAY_AFTER_ID: once for the whole
+day when a disaster's grid is first used, then for rows newer than the
+last id it has seen. This script times both reads.
+
+It creates a scratch copy of the table (same columns and day index as
+db/migrations), fills it with one day of reports for today, then keeps
+doubling it with older days. After each step it times the two top-up
+reads and records the EXPLAIN plan. With the day index the time should
+stay flat while the table grows; `--baseline` also times the full-day
+read with the index ignored, for comparison.
+
+Needs the MySQL server from db.db.DB_CONFIG.
+
+    python -m benchmarks.bench_request_queries --today 20000 --max-rows 20000000
+"""
+import argparse
+import datetime
+import random
+import statistics
+import time
+
+import mysql.connector
+
+from db.db import (
+    DB_CONFIG,
+    REQUESTS_DAY_INDEX,
+    SELECT_REQUESTS_FOR_DAY_AFTER_ID,
+    day_range,
+)
+
+TABLE = "bench_disaster_requests"
+CENTER = (6.9271, 79.8612)
+DISASTERS = 20
+
+CREATE_TABLE = f"""
+    CREATE TABLE {TABLE} (
+        id BIGINT AUTO_INCREMENT PRIMARY KEY,
+        disasterId INT NOT NULL,
+        latitude DECIMAL(10, 7),
+        longitude DECIMAL(10, 7),
+        status VARCHAR(32),
+        isVerified BOOLEAN DEFAULT FALSE,
+        created_at DATETIME NOT NULL,
+        INDEX {REQUESTS_DAY_INDEX} (disasterId, created_at, latitude, longitude)
+    )
+"""
+
+INSERT_ROW = f"""
+    INSERT INTO {TABLE} (disasterId, latitude, longitude, status, isVerified, created_at)
+    VALUES (%s, %s, %s, 'PENDING', FALSE, %s)
+"""
+
+# Copies every row `days` further into the past, so the table doubles
+# while the number of rows for today stays the same
+DOUBLE_INTO_PAST = f"""
+    INSERT INTO {TABLE} (disasterId, latitude, longitude, status, isVerified, created_at)
+    SELECT disasterId, latitude, longitude, status, isVerified, created_at - INTERVAL %s DAY
+    FROM {TABLE}
+"""
+
+QUERY = SELECT_REQUESTS_FOR_DAY_AFTER_ID.replace("disaster_requests", TABLE)
+
+# The same read without the day index
+BASELINE_QUERY = QUERY.replace(f"FROM {TABLE}", f"FROM {TABLE} IGNORE INDEX ({REQUESTS_DAY_INDEX})")
+
+# Where an incremental top-up starts: all but the newest few of today's rows
+SELECT_TOP_UP_START = f"""
+    SELECT id FROM {TABLE}
+    WHERE disasterId = %s AND created_at >= %s AND created_at < %s
+    ORDER BY id DESC LIMIT 1 OFFSET %s
+"""
+
+
+def seed_today(cursor, conn, rows: int):
+    day_start, _ = day_range(datetime.datetime.now())
+    batch = []
+    for _ in range(rows):
+        batch.append((
+            random.randint(1, DISASTERS),
+            CENTER[0] + random.uniform(-1, 1),
+            CENTER[1] + random.uniform(-1, 1),
+            day_start + datetime.timedelta(seconds=random.randint(0, 86399)),
+        ))
+        if len(batch) == 5000:
+            cursor.executemany(INSERT_ROW, batch)
+            batch = []
+    if batch:
+        cursor.executemany(INSERT_ROW, batch)
+    conn.commit()
+
+
+def timed(cursor, query: str, params: tuple, repeat: int) -> tuple:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        cursor.execute(query, params)
+        found = len(cursor.fetchall())
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples), found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--today", type=int, default=20000, help="reports created today, all disasters")
+    parser.add_argument("--max-rows", type=int, default=20_000_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--new-rows", type=int, default=20, help="rows returned by the incremental top-up")
+    parser.add_argument("--baseline", action="store_true", help="also time the unindexed query")
+    parser.add_argument("--keep", action="store_true", help="keep the scratch table afterwards")
+    args = parser.parse_args()
+
+    conn = mysql.connector.connect(**DB_CONFIG)
+    cursor = conn.cursor()
+    cursor.execute(f"DROP TABLE IF EXISTS {TABLE}")
+    cursor.execute(CREATE_TABLE)
+    seed_today(cursor, conn, args.today)
+
+    day_start, day_end = day_range(datetime.datetime.now())
+    full_params = (1, day_start, day_end, 0)
+    cursor.execute(SELECT_TOP_UP_START, (1, day_start, day_end, args.new_rows))
+    row = cursor.fetchone()
+    top_up_params = (1, day_start, day_end, row[0] if row else 0)
+
+    print(f"{'rows':>12} {'days':>6} {'full ms':>8} {'found':>6} {'top-up ms':>10} {'found':>6} "
+          f"{'key':<28} {'est rows':>9} {'baseline ms':>12}")
+    rows, days = args.today, 1
+    while True:
+        cursor.execute("ANALYZE TABLE " + TABLE)
+        cursor.fetchall()
+        cursor.execute("EXPLAIN " + QUERY, full_params)
+        columns = [c[0] for c in cursor.description]
+        plan = dict(zip(columns, cursor.fetchone()))
+
+        full_ms, full_found = timed(cursor, QUERY, full_params, args.repeat)
+        top_up_ms, top_up_found = timed(cursor, QUERY, top_up_params, args.repeat)
+        baseline = ""
+        if args.baseline:
+            baseline_ms, _ = timed(cursor, BASELINE_QUERY, full_params, 1)
+            baseline = f"{baseline_ms:.1f}"
+        print(f"{rows:>12} {days:>6} {full_ms:>8.2f} {full_found:>6} {top_up_ms:>10.2f} {top_up_found:>6} "
+              f"{str(plan.get('key')):<28} {str(plan.get('rows')):>9} {baseline:>12}")
+
+        if rows * 2 > args.max_rows:
+            break
+        cursor.execute(DOUBLE_INTO_PAST, (days,))
+        conn.commit()
+        rows, days = rows * 2, days * 2
+
+    if not args.keep:
+        cursor.execute(f"DROP TABLE {TABLE}")
+    cursor.close()
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Serialization time and bytes on the wire for /api/agent responses.
+
+Builds a final workflow result with N nearby resource centers and compares
+Flask's jsonify encoder with server.serialization (orjson), with and
+without a `fields=` projection, for identity, gzip and zstd encodings.
+
+    python -m benchmarks.bench_serialization --centers 50 500 2000
+"""
+import argparse
+import datetime
+import time
+
+from flask import Flask
+
+from db.records import Allocation, ResourceCenter
+from server.serialization import compress, dumps, project_fields
+
+PROJECTION = ["user_msg", "status", "allocated_resources"]
+
+
+def workflow_result(centers: int) -> dict:
+    return {
+        "input": {"message": "Request Id: 1\nDisaster: Flood\nSeverity: High\n..."},
+        "request": {
+            "request_id": 1, "disaster": "Flood", "disaster_id": 3, "disaster_status": "high",
+            "location": [6.9271, 79.8612], "affected_count": 40, "contact_info": "0771234567",
+            "image_path": "uploads/flood.jpg", "voice_path": None, "text_description": "Water rising fast",
+        },
+        "image_description": "A flooded street with water reaching the windows of parked cars. " * 4,
+        "voice_description": None,
+        "status": "verified",
+        "available_resources": [
+            ResourceCenter(i, i, 500, 120, 6.9 + i * 1e-4, 79.8 + i * 1e-4, 1234.5 + i)
+            for i in range(centers)
+        ],
+        "allocated_resources": [Allocation(1, 1, 10), Allocation(1, 2, 5)],
+        "disaster_status": "IN_PROGRESS",
+        "user_msg": "Stay safe, help is on the way. Your request has been verified.",
+        "nearby_reports": 7,
+        "degraded_modes": [],
+        "generated_at": datetime.datetime.now(),
+    }
+
+
+def timed(fn, repeat: int):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        out = fn()
+    return out, (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--centers", type=int, nargs="+", default=[50, 500, 2000])
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    flask_json = Flask(__name__).json
+
+    print(f"{'centers':>7} {'variant':<22} {'encode ms':>10} {'identity B':>11} "
+          f"{'gzip B':>8} {'gzip ms':>8} {'zstd B':>8} {'zstd ms':>8}")
+    for centers in args.centers:
+        result = workflow_result(centers)
+        variants = [
+            ("jsonify", lambda: flask_json.dumps(result).encode("utf-8")),
+            ("orjson", lambda: dumps(result)),
+            ("orjson + fields", lambda: dumps(project_fields(result, PROJECTION))),
+        ]
+        for name, encode in variants:
+            body, encode_ms = timed(encode, args.repeat)
+            (gz, _), gzip_ms = timed(lambda: compress(body, "gzip"), args.repeat)
+            (zs, _), zstd_ms = timed(lambda: compress(body, "zstd"), args.repeat)
+            print(f"{centers:>7} {name:<22} {encode_ms:>10.3f} {len(body):>11} "
+                  f"{len(gz):>8} {gzip_ms:>8.3f} {len(zs):>8} {zstd_ms:>8.3f}")
+
+
+if __name__ == "__main__":
+    main()
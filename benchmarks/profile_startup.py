@@ -0,0 +1,128 @@
+"""
+Cold-start profile and time-to-first-response budget for a fresh worker.
+
+Each measurement runs in a new interpreter, as an autoscaled worker would:
+
+1. `python -X importtime` on `import main; main.create_app()` gives the
+   import time per top-level package, largest first.
+2. A fresh process creates the Flask and ASGI apps and serves `/` and
+   `/api/tip`. The wall time from process start to the first response is
+   checked against the budget.
+3. The same process reports whether the workflow stack (langgraph,
+   pydantic, mysql, the agents) was loaded. It should only load on the
+   first /api/agent request or through WARMUP_WORKFLOW=1.
+
+The script exits with status 1 when a check fails, so it can run in CI.
+
+    python -m benchmarks.profile_startup --budget-ms 1500 --top 15
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules a worker must not import before its first /api/agent request
+WORKFLOW_STACK = ("langgraph", "langchain_core", "pydantic", "mysql", "dotenv", "requests",
+                  "httpx", "core.agents", "core.async_agents", "db.db", "db.async_db")
+
+FIRST_RESPONSE = """
+import asyncio, json, sys, time
+start = time.perf_counter()
+import main
+
+app = main.create_app()
+client = app.test_client()
+home = client.get("/")
+tip = client.get("/api/tip")
+flask_ms = (time.perf_counter() - start) * 1000
+
+async def asgi_get(asgi_app, path):
+    sent = []
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+    async def send(message):
+        sent.append(message)
+    scope = {"type": "http", "method": "GET", "path": path, "query_string": b"", "headers": []}
+    await asgi_app(scope, receive, send)
+    return sent[0]["status"]
+
+asgi_status = asyncio.run(asgi_get(main.create_asgi_app(), "/api/tip"))
+stack = %r
+print(json.dumps({
+    "flask_ms": flask_ms,
+    "statuses": [home.status_code, tip.status_code, asgi_status],
+    "loaded": sorted(m for m in sys.modules if m in stack or m.split(".")[0] in stack),
+}))
+"""
+
+
+def run(args: list, env: dict = None) -> subprocess.CompletedProcess:
+    return subprocess.run([sys.executable, *args], cwd=ROOT, capture_output=True, text=True,
+                          env={**os.environ, **(env or {})})
+
+
+def import_profile(top: int):
+    proc = run(["-X", "importtime", "-c", "import main; main.create_app()"], {"WARMUP_WORKFLOW": "0"})
+    if proc.returncode != 0:
+        print(proc.stderr[-2000:])
+        return False
+
+    packages = {}
+    total = 0
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line or "self [us]" in line:
+            continue
+        _, self_us, name = line[len("import time:"):].split("|")
+        # Sum self time per top-level package so nested imports are not counted twice
+        package = name.strip().split(".")[0]
+        packages[package] = packages.get(package, 0) + int(self_us)
+        total += int(self_us)
+
+    print(f"Import time for `import main; main.create_app()`: {total / 1000:.1f} ms")
+    print(f"{'package':<28} {'ms':>8} {'share':>6}")
+    for package, us in sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top]:
+        print(f"{package:<28} {us / 1000:>8.1f} {us / total:>6.1%}")
+    return True
+
+
+def first_response(budget_ms: float) -> bool:
+    start = time.perf_counter()
+    proc = run(["-c", FIRST_RESPONSE % (WORKFLOW_STACK,)], {"WARMUP_WORKFLOW": "0"})
+    wall_ms = (time.perf_counter() - start) * 1000
+    if proc.returncode != 0:
+        print(proc.stderr[-2000:])
+        return False
+
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    ok = True
+    print(f"\nFirst response: {wall_ms:.0f} ms from process start "
+          f"({result['flask_ms']:.0f} ms in-process), budget {budget_ms:.0f} ms")
+    if wall_ms > budget_ms:
+        print("❌ Time to first response is over budget")
+        ok = False
+    if result["statuses"] != [200, 200, 200]:
+        print(f"❌ Unexpected statuses for /, /api/tip (Flask) and /api/tip (ASGI): {result['statuses']}")
+        ok = False
+    if result["loaded"]:
+        print(f"❌ Workflow stack loaded before the first /api/agent request: {', '.join(result['loaded'])}")
+        ok = False
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--budget-ms", type=float, default=float(os.getenv("STARTUP_BUDGET_MS", "1500")))
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    ok = import_profile(args.top) and first_response(args.budget_ms)
+    print("OK" if ok else "FAILED")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
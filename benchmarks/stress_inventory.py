@@ -0,0 +1,120 @@
+"""
+Stress the inventory ledger with many concurrent allocators on one center.
+
+Several ledgers (one per simulated worker process) share a fake MySQL
+table that applies the same conditional UPDATE as db.db. Each ledger is
+hit by many threads that plan against a snapshot, then reserve and
+commit, re-planning once on a version conflict as the assign node does.
+At the end the script checks that nothing was over-allocated, that the
+table and the ledgers agree, and that no reservation leaked.
+
+    python -m benchmarks.stress_inventory --workers 4 --threads 32 --stock 1000
+"""
+import argparse
+import random
+import threading
+import time
+
+from core.inventory import InventoryLedger
+from db.records import Allocation
+
+CENTER = (1, 101, 0, 0, 6.9271, 79.8612)  # id, resourceId, count, used, lat, long
+
+
+class FakeTable:
+    """resource_centers + allocated_resources for one center, guarded like the SQL."""
+
+    def __init__(self, stock: int, latency: float):
+        self.count = stock
+        self.used = 0
+        self.rows = []
+        self.latency = latency
+        self._lock = threading.Lock()
+
+    def load(self):
+        with self._lock:
+            return [(CENTER[0], CENTER[1], self.count, self.used, CENTER[4], CENTER[5])]
+
+    def assign(self, request_id, resource_ids, amounts):
+        time.sleep(self.latency)
+        with self._lock:
+            total = sum(amounts)
+            if self.used + total > self.count:
+                return {"error": "insufficient stock", "conflict_ids": list(resource_ids), "results": {}}
+            self.used += total
+            allocations = [Allocation(request_id, r, a) for r, a in zip(resource_ids, amounts)]
+            self.rows.extend(allocations)
+        return {"status": "success", "results": allocations}
+
+
+def allocator(ledger: InventoryLedger, requests: int, max_amount: int, outcome: dict, lock):
+    for _ in range(requests):
+        request_id = random.randint(1, 10_000)
+        for _ in range(2):
+            centers, versions = ledger.nearby(CENTER[4], CENTER[5])
+            if not centers:
+                break
+            # The model "thinks" for a moment, so plans often go stale
+            time.sleep(random.uniform(0, 0.002))
+            res = ledger.allocate(request_id, [(CENTER[1], random.randint(1, max_amount))], versions)
+            if not res.get("version_conflict"):
+                break
+        else:
+            res = {"error": "stale plan twice"}
+        if not centers:
+            continue
+        with lock:
+            if res.get("status") == "success":
+                outcome["success"] += 1
+                outcome["units"] += sum(a.amount for a in res["results"])
+            else:
+                outcome["failed"] += 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=4, help="simulated worker processes (ledgers)")
+    parser.add_argument("--threads", type=int, default=32, help="allocator threads per worker")
+    parser.add_argument("--requests", type=int, default=50, help="allocations per thread")
+    parser.add_argument("--stock", type=int, default=1000)
+    parser.add_argument("--max-amount", type=int, default=5)
+    parser.add_argument("--db-latency", type=float, default=0.001)
+    args = parser.parse_args()
+
+    table = FakeTable(args.stock, args.db_latency)
+    ledgers = [
+        InventoryLedger(loader=table.load, persister=table.assign, reload_seconds=0.05)
+        for _ in range(args.workers)
+    ]
+
+    outcome = {"success": 0, "failed": 0, "units": 0}
+    lock = threading.Lock()
+    threads = [
+        threading.Thread(target=allocator, args=(ledger, args.requests, args.max_amount, outcome, lock))
+        for ledger in ledgers
+        for _ in range(args.threads)
+    ]
+
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    attempts = args.workers * args.threads * args.requests
+    print(f"{attempts} allocation attempts in {elapsed:.2f}s ({attempts / elapsed:.0f}/s)")
+    print(f"succeeded={outcome['success']} failed={outcome['failed']} units={outcome['units']} "
+          f"table_used={table.used}/{table.count}")
+    for i, ledger in enumerate(ledgers):
+        print(f"ledger {i}: {ledger.snapshot()}")
+
+    assert table.used <= table.count, "over-allocated"
+    assert table.used == outcome["units"] == sum(a.amount for a in table.rows), "table and results disagree"
+    assert all(ledger.snapshot()["reserved_units"] == 0 for ledger in ledgers), "leaked reservations"
+    assert all(ledger.snapshot()["open_reservations"] == 0 for ledger in ledgers), "leaked reservations"
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
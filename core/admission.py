@@ -0,0 +1,149 @@
+import math
+import os
+import threading
+import time
+from collections import deque
+
+
+class AdmissionRejected(Exception):
+    """Raised when the server is already holding as much work as it accepts."""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Server busy, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class ModelUnavailable(Exception):
+    """Raised instead of calling a model whose circuit breaker is open."""
+
+    def __init__(self, model: str, retry_after: int):
+        super().__init__(f"Model '{model}' is unavailable, retry after {retry_after}s")
+        self.model = model
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Per-model breaker over a sliding window of recent calls.
+    Trips when too many calls fail or are slow, stays open for `cooldown`
+    seconds and then lets a single trial call through (half open). A trial
+    that never reports back is given up after another `cooldown`.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, window: int = 20, min_calls: int = 5,
+                 error_rate: float = 0.5, slow_call_seconds: float = 30.0,
+                 slow_rate: float = 0.5, cooldown: float = 30.0):
+        self.name = name
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_rate = slow_rate
+        self.cooldown = cooldown
+        self.state = self.CLOSED
+        self.opened_at = None
+        self._trial_running = False
+        self._trial_started = None
+        self._calls = deque(maxlen=window)  # (failed, slow) per call
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.cooldown:
+                self.state = self.HALF_OPEN
+                self._trial_running = False
+            if self.state == self.HALF_OPEN and self._trial_running:
+                # The caller may have died without recording the outcome
+                if time.monotonic() - self._trial_started >= self.cooldown:
+                    self._trial_running = False
+            if self.state == self.HALF_OPEN and not self._trial_running:
+                self._trial_running = True
+                self._trial_started = time.monotonic()
+                return True
+            return False
+
+    def is_open(self) -> bool:
+        with self._lock:
+            return self.state == self.OPEN and time.monotonic() - self.opened_at < self.cooldown
+
+    def retry_after(self) -> int:
+        with self._lock:
+            if self.state != self.OPEN:
+                return 1
+            return max(1, math.ceil(self.cooldown - (time.monotonic() - self.opened_at)))
+
+    def _open(self):
+        self.state = self.OPEN
+        self.opened_at = time.monotonic()
+        self._trial_running = False
+        print(f"⚠️ Circuit breaker for '{self.name}' opened")
+
+    def _record(self, failed: bool, latency: float):
+        slow = latency >= self.slow_call_seconds
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                if failed or slow:
+                    self._open()
+                else:
+                    self.state = self.CLOSED
+                    self._calls.clear()
+                    print(f"Circuit breaker for '{self.name}' closed")
+                return
+
+            self._calls.append((failed, slow))
+            if self.state != self.CLOSED or len(self._calls) < self.min_calls:
+                return
+
+            total = len(self._calls)
+            failures = sum(1 for f, _ in self._calls if f)
+            slow_calls = sum(1 for _, s in self._calls if s)
+            if failures / total >= self.error_rate or slow_calls / total >= self.slow_rate:
+                self._open()
+                self._calls.clear()
+
+    def record_success(self, latency: float):
+        self._record(False, latency)
+
+    def record_failure(self, latency: float):
+        self._record(True, latency)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            total = len(self._calls)
+            return {
+                "state": self.state,
+                "calls_in_window": total,
+                "failures_in_window": sum(1 for f, _ in self._calls if f),
+                "slow_in_window": sum(1 for _, s in self._calls if s),
+            }
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(model: str) -> CircuitBreaker:
+    with _breakers_lock:
+        if model not in _breakers:
+            _breakers[model] = CircuitBreaker(
+                model,
+                slow_call_seconds=float(os.getenv("BREAKER_SLOW_CALL_SECONDS", "30")),
+                cooldown=float(os.getenv("BREAKER_COOLDOWN", "30")),
+            )
+        return _breakers[model]
+
+
+def breaker_snapshot() -> dict:
+    with _breakers_lock:
+        breakers = dict(_breakers)
+    return {model: breaker.snapshot() for model, breaker in breakers.items()}
+
+
+# Both models used by the workflow get a breaker up front so they show in metrics
+for _model in ("qwen3:4b", "llava:7b"):
+    get_breaker(_model)
@@ -9,42 +9,78 @@ import re
 import threading
 import base64
 import datetime
+import time
+import xxhash
 from pathlib import Path
 
-from db.db import change_status_after_assign_resources, resource_fetch, update_request_status, requests_fetch,assign_resources
+from db.db import change_status_after_assign_resources, update_request_status
+from db.records import Allocation, ResourceCenter
+from core.admission import ModelUnavailable, get_breaker
+from core.hotspots import hotspot_index
+from core.cache import get_cache
+from core.intake import parse_request_message
+from core.inventory import inventory
 
 load_dotenv()
 
 QWEN_API_KEY = os.getenv("QWEN_API_KEY")
+MODEL_API_URL = os.getenv("MODEL_API_URL", "https://e037d0b95762.ngrok-free.app/api/generate")
+MODEL_TIMEOUT = float(os.getenv("MODEL_TIMEOUT", "60"))
+# How often the assign node asks the model again when stock was taken while it planned
+ASSIGN_REPLANS = int(os.getenv("ASSIGN_REPLANS", "1"))
 PROJECT_ROOT = Path(__file__).resolve().parents[2]  # go 3 levels up from agents.py
 
+# Image descriptions keyed by a hash of the image bytes, shared by all workers
+media_cache = get_cache("media_descriptions", ttl=float(os.getenv("MEDIA_CACHE_TTL", "86400")))
+
+# Kept small on purpose: LangGraph validates and copies the state on every
+# node transition. Media paths live in `request`; DB rows are compact records.
 class AgentState(BaseModel):
     input: Optional[Dict[str, Any]] = None
-    image_path: Optional[str] = None
-    voice_path: Optional[str] = None
     request: Optional[Dict[str, Any]] = None
     image_description: Optional[str] = None
     voice_description: Optional[str] = None
     status: Optional[str] = "pending"
-    available_resources: Optional[List[Dict[str, Any]]] = None
-    allocated_resources: Optional[dict] = None
+    available_resources: Optional[List[ResourceCenter]] = None
+    stock_versions: Optional[Dict[int, int]] = None
+    allocated_resources: Optional[List[Allocation]] = None
     disaster_status: Optional[str] = "PENDING"
     user_msg:Optional[str]= None
+    nearby_reports: Optional[int] = None
+    degraded_modes: List[str] = []
+
+_workflow = None
+_workflow_lock = threading.Lock()
+
+def get_workflow():
+    # Compiled once per process; the scheduler's workers share it
+    global _workflow
+    if _workflow is None:
+        with _workflow_lock:
+            if _workflow is None:
+                _workflow = create_workflow()
+    return _workflow
 
 def run_agent_workflow(input_data: str):
     initial_state = AgentState(**input_data)
-    agent_workflow = create_workflow()
+    agent_workflow = get_workflow()
     config = {"recursion_limit": 100} 
     return agent_workflow.invoke(initial_state, config=config)
 
-def create_workflow():
+def create_workflow(nodes: Optional[Dict[str, Any]] = None):
+    # The async workflow passes its own node functions for the same graph
+    nodes = nodes or {
+        "request_intake": request_intake_agent,
+        "media_extraction": media_extraction_agent,
+        "verify_request": request_verify_agent,
+        "track_resources": resource_tracking_agent,
+        "assign_resources": resource_assign_agent,
+        "communicate_with_user": user_communication_agent,
+    }
+
     workflow = StateGraph(AgentState)
-    workflow.add_node("request_intake", request_intake_agent)
-    workflow.add_node("media_extraction", media_extraction_agent)  
-    workflow.add_node("verify_request", request_verify_agent)
-    workflow.add_node("track_resources", resource_tracking_agent)
-    workflow.add_node("assign_resources", resource_assign_agent)
-    workflow.add_node("communicate_with_user", user_communication_agent)
+    for name, node in nodes.items():
+        workflow.add_node(name, node)
 
     # Define flow
     workflow.set_entry_point("request_intake")
@@ -58,6 +94,34 @@ def create_workflow():
     return workflow.compile()
 
 
+def call_model(model: str, payload: dict) -> requests.Response:
+    """
+    POST to the model host through the model's circuit breaker.
+    Raises ModelUnavailable without calling the host while the breaker is open.
+    """
+    breaker = get_breaker(model)
+    if not breaker.allow():
+        raise ModelUnavailable(model, breaker.retry_after())
+
+    start = time.monotonic()
+    try:
+        res = requests.post(
+            MODEL_API_URL,
+            headers={"Content-Type": "application/json"},
+            json={"model": model, **payload},
+            timeout=MODEL_TIMEOUT
+        )
+        res.raise_for_status()
+    except BaseException:
+        # Cancellations and unexpected errors count too, so a half-open
+        # trial always reports back
+        breaker.record_failure(time.monotonic() - start)
+        raise
+
+    breaker.record_success(time.monotonic() - start)
+    return res
+
+
 def resolve_media_path(raw_path: str) -> Path:
     # normalize slashes
     raw_path = raw_path.replace("\\", "/")
@@ -92,6 +156,104 @@ def parse_workflow_response(response_text: str):
             return {}
 
 
+def model_response_text(model_output: str) -> str:
+    """Pull the generated text out of a non-streaming /api/generate body."""
+    model_output = model_output.strip()
+    try:
+        parsed_output = json.loads(model_output)
+    except json.JSONDecodeError:
+        print("⚠️ Model output is not valid JSON:", model_output)
+        parsed_output = {}
+    return parsed_output.get("response", "")
+
+
+def build_verify_prompt(state: AgentState) -> str:
+    return f"""
+    You are an intelligent request verification agent.
+
+    Your task is to use {state.request} , image_description: {state.image_description} ,voice_description: {state.voice_description} :
+            1. Verify the disaster request information using disaster and text_description in {state.request} , image_description and voice_description.
+            2. Update the status in to "pending", "verified", "invalid" as appropriate.
+
+    Give the output in the following format:
+    {{
+        "status": "<status>",
+    }}
+
+    Rules:
+    - If only one is available(image_description or text_description or voice_description) status is "pending".
+    - If it has two or three and they are match with each other and disaster name, status is "verified".
+    - If none of the above conditions are met, status is "invalid".
+    """
+
+
+def format_resource_centers(centers: Optional[List[ResourceCenter]]) -> str:
+    # One short line per center instead of the raw rows
+    if not centers:
+        return "[]"
+    return "\n".join(
+        f"- resourceId: {c.resource_id}, count: {c.count}, used: {c.used}, distance_km: {c.distance / 1000:.1f}"
+        for c in centers
+    )
+
+
+def build_assign_prompt(state: AgentState) -> str:
+    return f"""
+    You are an intelligent resource assignment agent.
+    Your task is to allocate the available resources from
+    {format_resource_centers(state.available_resources)}
+    to the disaster request {state.request}.
+    Reports received today within 10 km of this request: {state.nearby_reports}
+    RULES:
+    
+    
+    In the available resources
+            - count means all the resources at that center
+            - used means already allocated resources
+            - resourceId mean resource center id
+
+    Then you need to analyze the resource allocation and make decisions based on the available data. 
+    Give the output in the following format:
+    {{
+        "request_id": "<id>", id from state.request
+        "resource_center_ids": [<list of resource center ids which can assign to this request>],
+        "quantities": [<list of quantities corresponding to each resource center id>]
+    }}
+
+    Rules:
+    Assign resources to disaster requests by evaluating available quantities from resource centers. You must ensure:
+            - No over-allocation (never assign more than is available)
+            - Prioritized assignment based on proximity and resource availability
+            - Areas with more nearby reports may need larger quantities
+            - Each resource assignment marks the quantity as allocated
+    """
+
+
+def build_user_message_prompt(state: AgentState) -> str:
+    return f"""
+        You are an intelligent user communication agent. 
+        Your task is to create a short and clear message that can be sent to the user about their disaster request.
+
+        Information you have:
+        - Request details: {state.request}
+        - Verification status: {state.status}
+        - Allocated resources: {state.allocated_resources}
+        - Disaster severity/status: {state.disaster_status}
+
+        Rules for generating the message:
+        1. Always include a kind and motivating/encouraging sentence at the start (to keep the user hopeful and calm).
+        2. If the request is VERIFIED → acknowledge and confirm to the user.
+        If the request is NOT VERIFIED → politely explain that it cannot be verified right now, and mention that an agent will connect with them soon. 
+        Encourage the user to re-send the request if the situation worsens.
+        3. If resources are allocated → confirm to the user that help/resources are on the way.
+        If no resources are allocated → explain that currently resources are limited, but reassure them that help will reach soon.
+        4. Mention the disaster severity/status clearly so the user knows how serious the situation is.
+        5. The message should be short, simple, and easy to understand by anyone (avoid technical jargon).
+
+        Now, based on the above rules and given information, write one clear and supportive message for the user.
+        """
+
+
 # # Agent node implementations
 # def request_intake_agent(state: AgentState):
 #     print(f"Processing request intake: {state}")
@@ -163,56 +325,27 @@ def parse_workflow_response(response_text: str):
 
 #     return state
 
+def ingest_hotspot(request: dict):
+    # Every report goes into the live hotspot picture as soon as it is parsed
+    location = request.get("location")
+    if request.get("disaster_id") is None or not location or location == [0.0, 0.0]:
+        return
+    hotspot_index.ingest(request["disaster_id"], request.get("request_id"), location[0], location[1])
+
+
 def request_intake_agent(state: AgentState):
     print(f"Processing request intake: {state}")
     
     # Extract the input message from the state
     input_message = state.input['message'] if hasattr(state, 'input') and isinstance(state.input, dict) else str(state)
     
-    # Helper function to extract values using regex
-    def extract(pattern, default=None):
-        match = re.search(pattern, input_message, re.IGNORECASE)
-        return match.group(1).strip() if match else default
-
-    # Extract all required fields
-    request_id = extract(r'Request Id: (\d+)', None)
-    disaster = extract(r'Disaster: (.+)', "Not applicable")
-    disaster_id = extract(r'Disaster ID: (\d+)', None)
-    severity_match = extract(r'Severity: (.+)', '').lower()
-    disaster_status = (
-        'critical' if 'critical' in severity_match else
-        'high' if 'high' in severity_match else
-        'medium' if 'medium' in severity_match else
-        'low' if 'low' in severity_match else
-        'Not applicable'
-    )
-    loc_match = re.search(r'Latitude ([\d.]+), Longitude ([\d.]+)', input_message, re.IGNORECASE)
-    location = [float(loc_match.group(1)), float(loc_match.group(2))] if loc_match else [0.0, 0.0]
-    affected_count = extract(r'Affected Count: (\d+)', 0)
-    contact_info = extract(r'Contact No: (.+)', "Not applicable")
-    image_path = extract(r'Image_path: (.+)', None)
-    voice_path = extract(r'Voice_path: (.+)', None)
-    text_description = extract(r'Details: (.+)', "Not applicable")
-
-    # Build the response JSON
-    response_json = {
-        "request_id": int(request_id) if request_id else None,
-        "disaster": disaster,
-        "disaster_id": int(disaster_id) if disaster_id else None,
-        "disaster_status": disaster_status,
-        "location": location,
-        "affected_count": int(affected_count) if affected_count else 0,
-        "contact_info": contact_info,
-        "image_path": image_path,
-        "voice_path": voice_path,
-        "text_description": text_description
-    }
+    response_json = parse_request_message(input_message)
 
     # Update state fields
-    state.image_path = image_path
-    state.voice_path = voice_path
     state.request = response_json
 
+    ingest_hotspot(response_json)
+
     return state
 
 
@@ -220,9 +353,16 @@ def media_extraction_agent(state: AgentState):
     print("Extracting media descriptions...")
 
     def process_image():
-        if state.image_path:
+        image_path = state.request.get("image_path")
+        if image_path:
+            if get_breaker("llava:7b").is_open():
+                # Degraded mode: don't wait on the image model during an outage
+                state.request["image_description"] = "Not applicable"
+                state.degraded_modes.append("image_description_skipped")
+                print("⚠️ Image model unavailable, skipping image description")
+                return
             try:
-                resolved_path = resolve_media_path(state.image_path)
+                resolved_path = resolve_media_path(image_path)
                 print(f"Resolved path: {resolved_path}")
 
                 if not resolved_path.exists():
@@ -232,22 +372,29 @@ def media_extraction_agent(state: AgentState):
                 
                 with open(resolved_path, "rb") as img_file:
                     image_bytes = img_file.read()
-                    image_b64 = base64.b64encode(image_bytes).decode("utf-8")  # ✅ Encode
-                res = requests.post(
-                    "https://e037d0b95762.ngrok-free.app/api/generate",
-                    headers={"Content-Type": "application/json"},
-                    json={
-                        "model": "llava:7b",
-                        "prompt": "Describe the image in detail focusing on disaster context.",
-                        "images": [image_b64],
-                        "stream": False
-                    }
-                )
-                res.raise_for_status()
+
+                image_key = xxhash.xxh3_128_hexdigest(image_bytes)
+                cached_description = media_cache.get(image_key)
+                if cached_description is not None:
+                    state.image_description = cached_description
+                    return
+
+                image_b64 = base64.b64encode(image_bytes).decode("utf-8")  # ✅ Encode
+                res = call_model("llava:7b", {
+                    "prompt": "Describe the image in detail focusing on disaster context.",
+                    "images": [image_b64],
+                    "stream": False
+                })
                 response_data = res.json()
                 image_description = response_data.get('response', '').strip()
                 print(f"Image description response: {image_description}")
                 state.image_description = image_description
+                if image_description:
+                    media_cache.set(image_key, image_description)
+            except ModelUnavailable as e:
+                state.request["image_description"] = "Not applicable"
+                state.degraded_modes.append("image_description_skipped")
+                print(f"⚠️ {e}")
             except Exception as e:
                 state.request["image_description"] = "Not applicable"
                 print(f"⚠️ Image extraction error: {e}")
@@ -279,10 +426,10 @@ def media_extraction_agent(state: AgentState):
 def request_verify_agent(state: AgentState):
     print("Verifying request...")
 
-    # Get all the disaster which has same details
-    res = requests_fetch(state.request.get("location", [0,0]),state.request.get("disaster_id",0))
-    # Get number of previous requests
-    no_of_previous_requests = len(res.get("disaster_data", []))
+    # Count today's reports for the same disaster within 10 km from the hotspot index
+    lat, long = state.request.get("location") or [0.0, 0.0]
+    no_of_previous_requests = hotspot_index.count_nearby(state.request.get("disaster_id"), lat, long)
+    state.nearby_reports = no_of_previous_requests
 
     if no_of_previous_requests >=5:
         state.status = "verified"
@@ -292,46 +439,23 @@ def request_verify_agent(state: AgentState):
 
     print(f"Number of previous requests: {no_of_previous_requests}")
 
-    prompt = f"""
-    You are an intelligent request verification agent.
-
-    Your task is to use {state.request} , image_description: {state.image_description} ,voice_description: {state.voice_description} :
-            1. Verify the disaster request information using disaster and text_description in {state.request} , image_description and voice_description.
-            2. Update the status in to "pending", "verified", "invalid" as appropriate.
-
-    Give the output in the following format:
-    {{
-        "status": "<status>",
-    }}
+    if get_breaker("qwen3:4b").is_open():
+        # Degraded mode: without the model the report is kept for manual review
+        state.status = "pending"
+        state.degraded_modes.append("deterministic_verification")
+        print("⚠️ Verification model unavailable, request left pending")
+        return state
 
-    Rules:
-    - If only one is available(image_description or text_description or voice_description) status is "pending".
-    - If it has two or three and they are match with each other and disaster name, status is "verified".
-    - If none of the above conditions are met, status is "invalid".
-    """
+    prompt = build_verify_prompt(state)
 
     try:
-        res = requests.post(
-                "https://e037d0b95762.ngrok-free.app/api/generate",
-                headers={"Content-Type": "application/json"},
-                json={
-                    "model": "qwen3:4b",
-                    "prompt": prompt,
-                    "stream": False,
-                    "options": {"temperature": 0.2}
-                },
-            )
-        res.raise_for_status()
-
-        model_output = res.text.strip()
-        try:
-            parsed_output = json.loads(model_output)
-                
-        except json.JSONDecodeError:
-                print("⚠️ Model output is not valid JSON:", model_output)
-                parsed_output = {}
+        res = call_model("qwen3:4b", {
+            "prompt": prompt,
+            "stream": False,
+            "options": {"temperature": 0.2}
+        })
 
-        response_text = parsed_output.get("response", "")
+        response_text = model_response_text(res.text)
         status_res = parse_workflow_response(response_text)
         print(f"Status output: {status_res}")
 
@@ -341,7 +465,10 @@ def request_verify_agent(state: AgentState):
 
         state.status = status_res.get('status', '').strip()
 
-
+    except ModelUnavailable as e:
+        state.status = "pending"
+        state.degraded_modes.append("deterministic_verification")
+        print(f"⚠️ {e}")
     except requests.RequestException as e:
         print(f"❌ Error calling LLM API: {e}")
 
@@ -351,21 +478,17 @@ def resource_tracking_agent(state: AgentState):
     print("Tracking resources...")
 
     try:
-        request_id = state.request.get("request_id",None)
-
-        print(f"Fetching resources for request_id: {request_id}")
-
-        res = resource_fetch(request_id)
+        lat, long = state.request.get("location") or [0.0, 0.0]
 
-        if res.get("status") != "success":
-            print(f"⚠️ Resource fetch failed: {res.get('error', 'Unknown error')}")
-            state.available_resources = {}
-            return state
+        print(f"Fetching resources near ({lat}, {long})")
 
-        all_available_resources = res.get("resources", [])
-        print("Available resources:", all_available_resources)
+        # Read from the inventory ledger; versions let the assignment detect
+        # stock that changed while the model was deciding
+        all_available_resources, versions = inventory.nearby(lat, long)
+        print(f"Available resources: {len(all_available_resources)} center(s)")
 
         state.available_resources = all_available_resources
+        state.stock_versions = versions
 
         # Parse the data to the LLM to  select most suitable resource for the mentioned disaster.
     except Exception as e:
@@ -373,65 +496,59 @@ def resource_tracking_agent(state: AgentState):
 
     return state
 
-def resource_assign_agent(state: AgentState):
-    print("Assigning resources...")
+def allocation_items(res_clear: dict) -> list:
+    """(resource center id, quantity) pairs from the model's allocation, skipping malformed ones."""
+    items = []
+    for resource_id, amount in zip(res_clear.get("resource_center_ids", []), res_clear.get("quantities", [])):
+        try:
+            items.append((int(resource_id), int(amount)))
+        except (TypeError, ValueError):
+            print(f"⚠️ Ignoring malformed allocation: {resource_id} -> {amount}")
+    return items
 
-    PROMPT = f"""
-    You are an intelligent resource assignment agent.
-    Your task is to allocate the available resources from {state.available_resources} to the disaster request {state.request}.
-    RULES:
-    
-    
-    In the available resources
-            - count means all the resources at that center
-            - used means already allocated resources
-            - resourceId mean resource center id
 
-    Then you need to analyze the resource allocation and make decisions based on the available data. 
-    Give the output in the following format:
-    {{
-        "request_id": "<id>", id from state.request
-        "resource_center_ids": [<list of resource center ids which can assign to this request>],
-        "quantities": [<list of quantities corresponding to each resource center id>]
-    }}
+def resource_assign_agent(state: AgentState):
+    print("Assigning resources...")
 
-    Rules:
-    Assign resources to disaster requests by evaluating available quantities from resource centers. You must ensure:
-            - No over-allocation (never assign more than is available)
-            - Prioritized assignment based on proximity and resource availability
-            - Each resource assignment marks the quantity as allocated
-    """
+    if get_breaker("qwen3:4b").is_open():
+        # Degraded mode: allocation is left to dispatchers until the model is back
+        state.degraded_modes.append("allocation_skipped")
+        print("⚠️ Assignment model unavailable, skipping resource allocation")
+        return state
 
     try:
-        res = requests.post(
-                "https://e037d0b95762.ngrok-free.app/api/generate",
-                headers={"Content-Type": "application/json"},
-                json={
-                    "model": "qwen3:4b",
-                    "prompt": PROMPT,
-                    "stream": False,
-                    "options": {"temperature": 0.2}
-                },
+        for attempt in range(ASSIGN_REPLANS + 1):
+            if attempt:
+                # The plan was made on stock that has since been taken: re-plan
+                print("⚠️ Stock changed while planning, re-planning against current stock")
+                lat, long = state.request.get("location") or [0.0, 0.0]
+                state.available_resources, state.stock_versions = inventory.nearby(lat, long)
+
+            PROMPT = build_assign_prompt(state)
+            res = call_model("qwen3:4b", {
+                "prompt": PROMPT,
+                "stream": False,
+                "options": {"temperature": 0.2}
+            })
+
+            response_text = model_response_text(res.text)
+            res_clear = parse_workflow_response(response_text)
+            print(f"Allocation Resource: {res_clear}")
+            if not res_clear:
+                break
+
+            # Reserve the stock in the ledger and save the allocation to the database
+            response = inventory.allocate(
+                res_clear.get("request_id"),
+                allocation_items(res_clear),
+                expected_versions=state.stock_versions
             )
-        res.raise_for_status()
-
-        model_output = res.text.strip()
-        try:
-            parsed_output = json.loads(model_output)
-                
-        except json.JSONDecodeError:
-                print("⚠️ Model output is not valid JSON:", model_output)
-                parsed_output = {}
+            if not response.get("version_conflict"):
+                break
 
-        response_text = parsed_output.get("response", "")
-        res_clear = parse_workflow_response(response_text)
-        print(f"Allocation Resource: {res_clear}")
-
-        # Save the allocation results to the database
         if res_clear:
-            response = assign_resources(res_clear.get("request_id"),res_clear.get("resource_center_ids",[]),res_clear.get("quantities",[]))
             if response.get("status") == "success":
-                state.allocated_resources = res_clear
+                state.allocated_resources = response.get("results")
                 print("Resource allocation successful.")
                 print(res_clear.get("request_id"))
                 get_status = change_status_after_assign_resources(res_clear.get("request_id"), "success")
@@ -439,66 +556,66 @@ def resource_assign_agent(state: AgentState):
                 # Update the state with the new status
                 state.disaster_status = get_status.get('status')
 
+    except ModelUnavailable as e:
+        state.degraded_modes.append("allocation_skipped")
+        print(f"⚠️ {e}")
     except requests.RequestException as e:
         print(f"❌ Error calling LLM API: {e}")
 
     return state
 
 
-def user_communication_agent(state: AgentState):
-    print("Communicating with user...")
+def fallback_user_message(state: AgentState) -> str:
+    """Template message used when the model host cannot write one."""
+    parts = ["Stay safe, we have received your request and we are here to help."]
 
-    PROMPT = f"""
-        You are an intelligent user communication agent. 
-        Your task is to create a short and clear message that can be sent to the user about their disaster request.
+    if state.status == "verified":
+        parts.append("Your request has been verified.")
+    else:
+        parts.append("We could not verify your request right now, an agent will contact you soon. "
+                     "Please send the request again if the situation gets worse.")
 
-        Information you have:
-        - Request details: {state.request}
-        - Verification status: {state.status}
-        - Allocated resources: {state.allocated_resources}
-        - Disaster severity/status: {state.disaster_status}
+    if state.allocated_resources:
+        parts.append("Help and resources are on the way to you.")
+    else:
+        parts.append("Resources are limited at the moment, but help will reach you soon.")
 
-        Rules for generating the message:
-        1. Always include a kind and motivating/encouraging sentence at the start (to keep the user hopeful and calm).
-        2. If the request is VERIFIED → acknowledge and confirm to the user.
-        If the request is NOT VERIFIED → politely explain that it cannot be verified right now, and mention that an agent will connect with them soon. 
-        Encourage the user to re-send the request if the situation worsens.
-        3. If resources are allocated → confirm to the user that help/resources are on the way.
-        If no resources are allocated → explain that currently resources are limited, but reassure them that help will reach soon.
-        4. Mention the disaster severity/status clearly so the user knows how serious the situation is.
-        5. The message should be short, simple, and easy to understand by anyone (avoid technical jargon).
+    severity = (state.request or {}).get("disaster_status")
+    if severity and severity != "Not applicable":
+        parts.append(f"The reported severity is {severity}.")
 
-        Now, based on the above rules and given information, write one clear and supportive message for the user.
-        """
+    return " ".join(parts)
+
+
+def user_communication_agent(state: AgentState):
+    print("Communicating with user...")
+
+    if get_breaker("qwen3:4b").is_open():
+        # Degraded mode: send a template message instead of waiting on the model
+        state.user_msg = fallback_user_message(state)
+        state.degraded_modes.append("template_message")
+        return state
+
+    PROMPT = build_user_message_prompt(state)
     
     try:
-        res = requests.post(
-                "https://e037d0b95762.ngrok-free.app/api/generate",
-                headers={"Content-Type": "application/json"},
-                json={
-                    "model": "qwen3:4b",
-                    "prompt": PROMPT,
-                    "stream": False,
-                    "options": {"temperature": 0.2}
-                },
-            )
-        res.raise_for_status()
-
-        model_output = res.text.strip()
-        try:
-            parsed_output = json.loads(model_output)
-                
-        except json.JSONDecodeError:
-                print("⚠️ Model output is not valid JSON:", model_output)
-                parsed_output = {}
+        res = call_model("qwen3:4b", {
+            "prompt": PROMPT,
+            "stream": False,
+            "options": {"temperature": 0.2}
+        })
 
-        response_text = parsed_output.get("response", "")
+        response_text = model_response_text(res.text)
         res_clear = re.sub(r'<think>.*?</think>', '', response_text, flags=re.DOTALL).strip()
         print(f"User MSG: {res_clear}")
 
         # Save the allocation results to the database
         state.user_msg = res_clear
 
+    except ModelUnavailable as e:
+        state.user_msg = fallback_user_message(state)
+        state.degraded_modes.append("template_message")
+        print(f"⚠️ {e}")
     except requests.RequestException as e:
         print(f"❌ Error calling LLM API: {e}")
 
@@ -0,0 +1,312 @@
+import base64
+import os
+import re
+import time
+
+import anyio
+import httpx
+import xxhash
+
+from core.admission import ModelUnavailable, get_breaker
+from core.agents import (
+    ASSIGN_REPLANS,
+    MODEL_API_URL,
+    MODEL_TIMEOUT,
+    AgentState,
+    allocation_items,
+    build_assign_prompt,
+    build_user_message_prompt,
+    build_verify_prompt,
+    create_workflow,
+    fallback_user_message,
+    media_cache,
+    model_response_text,
+    parse_workflow_response,
+    request_intake_agent,
+    resolve_media_path,
+)
+from core.hotspots import hotspot_index
+from core.inventory import inventory
+from db.async_db import (
+    change_status_after_assign_resources,
+    update_request_status,
+)
+
+# Async versions of the agent nodes in core.agents. Prompts, parsing and the
+# degraded-mode fallbacks are shared; only the I/O is awaited, so one event
+# loop can hold many workflows that are waiting on the model host or MySQL.
+
+MODEL_MAX_CONNECTIONS = int(os.getenv("MODEL_MAX_CONNECTIONS", "100"))
+
+_client = None
+_async_workflow = None
+
+
+def get_model_client() -> httpx.AsyncClient:
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(
+            timeout=MODEL_TIMEOUT,
+            limits=httpx.Limits(max_connections=MODEL_MAX_CONNECTIONS),
+        )
+    return _client
+
+
+async def close_model_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+async def acall_model(model: str, payload: dict) -> httpx.Response:
+    """Async call_model: same breaker accounting, awaited HTTP."""
+    breaker = get_breaker(model)
+    if not breaker.allow():
+        raise ModelUnavailable(model, breaker.retry_after())
+
+    start = time.monotonic()
+    try:
+        res = await get_model_client().post(
+            MODEL_API_URL,
+            headers={"Content-Type": "application/json"},
+            json={"model": model, **payload},
+        )
+        res.raise_for_status()
+    except BaseException:
+        # Cancellations and unexpected errors count too, so a half-open
+        # trial always reports back
+        breaker.record_failure(time.monotonic() - start)
+        raise
+
+    breaker.record_success(time.monotonic() - start)
+    return res
+
+
+def get_async_workflow():
+    global _async_workflow
+    if _async_workflow is None:
+        _async_workflow = create_async_workflow()
+    return _async_workflow
+
+
+async def arun_agent_workflow(input_data: dict):
+    initial_state = AgentState(**input_data)
+    config = {"recursion_limit": 100}
+    return await get_async_workflow().ainvoke(initial_state, config=config)
+
+
+def create_async_workflow():
+    return create_workflow({
+        "request_intake": arequest_intake_agent,
+        "media_extraction": amedia_extraction_agent,
+        "verify_request": arequest_verify_agent,
+        "track_resources": aresource_tracking_agent,
+        "assign_resources": aresource_assign_agent,
+        "communicate_with_user": auser_communication_agent,
+    })
+
+
+async def arequest_intake_agent(state: AgentState):
+    # Intake is pure regex parsing, no I/O to await
+    return request_intake_agent(state)
+
+
+async def amedia_extraction_agent(state: AgentState):
+    print("Extracting media descriptions...")
+
+    image_path = state.request.get("image_path")
+    if not image_path:
+        return state
+
+    if get_breaker("llava:7b").is_open():
+        state.request["image_description"] = "Not applicable"
+        state.degraded_modes.append("image_description_skipped")
+        print("⚠️ Image model unavailable, skipping image description")
+        return state
+
+    try:
+        resolved_path = anyio.Path(resolve_media_path(image_path))
+
+        if not await resolved_path.exists():
+            print(f"⚠️ File not found at: {resolved_path}")
+            state.request["image_description"] = "Not applicable"
+            return state
+
+        image_bytes = await resolved_path.read_bytes()
+
+        image_key = xxhash.xxh3_128_hexdigest(image_bytes)
+        # The cache's shared tier is SQLite; keep its I/O off the event loop
+        cached_description = await anyio.to_thread.run_sync(media_cache.get, image_key)
+        if cached_description is not None:
+            state.image_description = cached_description
+            return state
+
+        image_b64 = base64.b64encode(image_bytes).decode("utf-8")
+        res = await acall_model("llava:7b", {
+            "prompt": "Describe the image in detail focusing on disaster context.",
+            "images": [image_b64],
+            "stream": False
+        })
+        image_description = res.json().get('response', '').strip()
+        print(f"Image description response: {image_description}")
+        state.image_description = image_description
+        if image_description:
+            await anyio.to_thread.run_sync(media_cache.set, image_key, image_description)
+    except ModelUnavailable as e:
+        state.request["image_description"] = "Not applicable"
+        state.degraded_modes.append("image_description_skipped")
+        print(f"⚠️ {e}")
+    except Exception as e:
+        state.request["image_description"] = "Not applicable"
+        print(f"⚠️ Image extraction error: {e}")
+
+    return state
+
+
+async def arequest_verify_agent(state: AgentState):
+    print("Verifying request...")
+
+    # The index only touches MySQL when it tops itself up, off the event loop
+    lat, long = state.request.get("location") or [0.0, 0.0]
+    no_of_previous_requests = await anyio.to_thread.run_sync(
+        hotspot_index.count_nearby, state.request.get("disaster_id"), lat, long
+    )
+    state.nearby_reports = no_of_previous_requests
+
+    if no_of_previous_requests >= 5:
+        state.status = "verified"
+        await update_request_status(state.request.get("request_id"), "verified")
+        print("Request verified because it has 5 or more similar previous requests.")
+        return state
+
+    print(f"Number of previous requests: {no_of_previous_requests}")
+
+    if get_breaker("qwen3:4b").is_open():
+        state.status = "pending"
+        state.degraded_modes.append("deterministic_verification")
+        print("⚠️ Verification model unavailable, request left pending")
+        return state
+
+    try:
+        res = await acall_model("qwen3:4b", {
+            "prompt": build_verify_prompt(state),
+            "stream": False,
+            "options": {"temperature": 0.2}
+        })
+
+        status_res = parse_workflow_response(model_response_text(res.text))
+        print(f"Status output: {status_res}")
+
+        if status_res.get('status') == "verified":
+            await update_request_status(state.request.get("request_id"), "verified")
+
+        state.status = status_res.get('status', '').strip()
+
+    except ModelUnavailable as e:
+        state.status = "pending"
+        state.degraded_modes.append("deterministic_verification")
+        print(f"⚠️ {e}")
+    except httpx.HTTPError as e:
+        print(f"❌ Error calling LLM API: {e}")
+
+    return state
+
+
+async def aresource_tracking_agent(state: AgentState):
+    print("Tracking resources...")
+
+    try:
+        # In memory except for the ledger's periodic reload, so run it off the loop
+        lat, long = state.request.get("location") or [0.0, 0.0]
+        state.available_resources, state.stock_versions = await anyio.to_thread.run_sync(
+            inventory.nearby, lat, long
+        )
+    except Exception as e:
+        print(f"⚠️ Resource tracking error: {e}")
+
+    return state
+
+
+async def aresource_assign_agent(state: AgentState):
+    print("Assigning resources...")
+
+    if get_breaker("qwen3:4b").is_open():
+        state.degraded_modes.append("allocation_skipped")
+        print("⚠️ Assignment model unavailable, skipping resource allocation")
+        return state
+
+    try:
+        for attempt in range(ASSIGN_REPLANS + 1):
+            if attempt:
+                print("⚠️ Stock changed while planning, re-planning against current stock")
+                lat, long = state.request.get("location") or [0.0, 0.0]
+                state.available_resources, state.stock_versions = await anyio.to_thread.run_sync(
+                    inventory.nearby, lat, long
+                )
+
+            res = await acall_model("qwen3:4b", {
+                "prompt": build_assign_prompt(state),
+                "stream": False,
+                "options": {"temperature": 0.2}
+            })
+
+            res_clear = parse_workflow_response(model_response_text(res.text))
+            print(f"Allocation Resource: {res_clear}")
+            if not res_clear:
+                break
+
+            # The ledger commits through the blocking DB layer
+            response = await anyio.to_thread.run_sync(
+                lambda: inventory.allocate(
+                    res_clear.get("request_id"),
+                    allocation_items(res_clear),
+                    expected_versions=state.stock_versions
+                )
+            )
+            if not response.get("version_conflict"):
+                break
+
+        if res_clear:
+            if response.get("status") == "success":
+                state.allocated_resources = response.get("results")
+                get_status = await change_status_after_assign_resources(res_clear.get("request_id"), "success")
+                print(f"Status change result: {get_status.get('status')}")
+                state.disaster_status = get_status.get('status')
+
+    except ModelUnavailable as e:
+        state.degraded_modes.append("allocation_skipped")
+        print(f"⚠️ {e}")
+    except httpx.HTTPError as e:
+        print(f"❌ Error calling LLM API: {e}")
+
+    return state
+
+
+async def auser_communication_agent(state: AgentState):
+    print("Communicating with user...")
+
+    if get_breaker("qwen3:4b").is_open():
+        state.user_msg = fallback_user_message(state)
+        state.degraded_modes.append("template_message")
+        return state
+
+    try:
+        res = await acall_model("qwen3:4b", {
+            "prompt": build_user_message_prompt(state),
+            "stream": False,
+            "options": {"temperature": 0.2}
+        })
+
+        response_text = model_response_text(res.text)
+        state.user_msg = re.sub(r'<think>.*?</think>', '', response_text, flags=re.DOTALL).strip()
+        print(f"User MSG: {state.user_msg}")
+
+    except ModelUnavailable as e:
+        state.user_msg = fallback_user_message(state)
+        state.degraded_modes.append("template_message")
+        print(f"⚠️ {e}")
+    except httpx.HTTPError as e:
+        print(f"❌ Error calling LLM API: {e}")
+
+    return state
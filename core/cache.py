@@ -0,0 +1,255 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import orjson
+
+# Two-tier cache shared by all worker processes on a host.
+# L2 is a SQLite file in WAL mode, so every worker reads what any worker wrote.
+# L1 is a small per-process LRU in front of it. An invalidation clears L2 and
+# the local L1 straight away; other workers' L1 entries live at most
+# `l1_ttl` seconds, which bounds how stale they can be.
+# Values are stored as JSON (orjson), so only JSON-native values are cached
+# and reading the shared file can never run code.
+# The file is opened on first use, not at import. If it cannot be opened the
+# caches run L1-only and try again after STORE_RETRY_SECONDS.
+
+
+def default_cache_path() -> str:
+    base = os.getenv("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "survivorsync", "cache.sqlite3")
+
+
+CACHE_PATH = os.getenv("CACHE_PATH") or default_cache_path()
+STORE_RETRY_SECONDS = float(os.getenv("CACHE_STORE_RETRY_SECONDS", "30"))
+
+
+def ensure_private_dir(path: str):
+    """Create `path` with mode 0700, or refuse it if another user owns it."""
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    if not hasattr(os, "getuid"):
+        return
+    st = os.stat(path)
+    if st.st_uid != os.getuid():
+        raise PermissionError(f"Cache directory {path} is not owned by the service user")
+    if st.st_mode & 0o077:
+        os.chmod(path, 0o700)
+
+
+class SQLiteStore:
+    PURGE_EVERY = 500  # sets between sweeps of expired rows
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._pid = os.getpid()
+        self._sets = 0
+        ensure_private_dir(os.path.dirname(os.path.abspath(path)))
+        self._conn().execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            " namespace TEXT NOT NULL, key TEXT NOT NULL, value BLOB NOT NULL,"
+            " expires_at REAL NOT NULL, PRIMARY KEY (namespace, key))"
+        )
+
+    def _conn(self) -> sqlite3.Connection:
+        if self._pid != os.getpid():
+            # Connections must not cross a fork (e.g. a preloading server)
+            self._local = threading.local()
+            self._pid = os.getpid()
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # Created 0600 so the -wal and -shm files SQLite adds inherit it
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+            os.close(fd)
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, namespace: str, key: str):
+        row = self._conn().execute(
+            "SELECT value, expires_at FROM cache WHERE namespace = ? AND key = ?",
+            (namespace, key)
+        ).fetchone()
+        if row is None or row[1] < time.time():
+            return None
+        return row[0], row[1]
+
+    def set(self, namespace: str, key: str, value: bytes, expires_at: float):
+        conn = self._conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO cache (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+            (namespace, key, value, expires_at)
+        )
+        self._sets += 1
+        if self._sets % self.PURGE_EVERY == 0:
+            conn.execute("DELETE FROM cache WHERE expires_at < ?", (time.time(),))
+
+    def delete(self, namespace: str, key: str = None):
+        if key is None:
+            self._conn().execute("DELETE FROM cache WHERE namespace = ?", (namespace,))
+        else:
+            self._conn().execute("DELETE FROM cache WHERE namespace = ? AND key = ?", (namespace, key))
+
+
+class TieredCache:
+    """
+    One namespace of the cache: in-process L1 in front of the shared store.
+    `open_store` returns the store, or None while it cannot be opened.
+    """
+
+    def __init__(self, namespace: str, open_store, ttl: float,
+                 l1_ttl: float = 5.0, l1_max: int = 1024):
+        self.namespace = namespace
+        self.open_store = open_store
+        self.ttl = ttl
+        self.l1_ttl = min(l1_ttl, ttl)
+        self.l1_max = l1_max
+        self._l1 = OrderedDict()  # key -> (value, expires_at)
+        self._lock = threading.Lock()
+        self.stats = {"l1_hits": 0, "l2_hits": 0, "misses": 0, "sets": 0, "invalidations": 0, "errors": 0}
+
+    def _l1_put(self, key: str, value, expires_at: float):
+        self._l1[key] = (value, min(expires_at, time.time() + self.l1_ttl))
+        self._l1.move_to_end(key)
+        while len(self._l1) > self.l1_max:
+            self._l1.popitem(last=False)
+
+    def get(self, key: str, default=None):
+        key = str(key)
+        with self._lock:
+            entry = self._l1.get(key)
+            if entry is not None:
+                if entry[1] >= time.time():
+                    self._l1.move_to_end(key)
+                    self.stats["l1_hits"] += 1
+                    return entry[0]
+                del self._l1[key]
+
+        row = None
+        store = self._store()
+        if store is not None:
+            try:
+                row = store.get(self.namespace, key)
+            except (sqlite3.Error, OSError) as e:
+                print(f"⚠️ Cache read error: {e}")
+                self._error()
+
+        with self._lock:
+            if row is None:
+                self.stats["misses"] += 1
+                return default
+            try:
+                value = orjson.loads(row[0])
+            except orjson.JSONDecodeError:
+                self.stats["errors"] += 1
+                return default
+            self._l1_put(key, value, row[1])
+            self.stats["l2_hits"] += 1
+            return value
+
+    def set(self, key: str, value):
+        key = str(key)
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            self._l1_put(key, value, expires_at)
+            self.stats["sets"] += 1
+        store = self._store()
+        if store is None:
+            return
+        try:
+            store.set(self.namespace, key, orjson.dumps(value), expires_at)
+        except (sqlite3.Error, OSError, TypeError) as e:
+            print(f"⚠️ Cache write error: {e}")
+            self._error()
+
+    def invalidate(self, key: str = None):
+        with self._lock:
+            if key is None:
+                self._l1.clear()
+            else:
+                self._l1.pop(str(key), None)
+            self.stats["invalidations"] += 1
+        store = self._store()
+        if store is None:
+            return
+        try:
+            store.delete(self.namespace, None if key is None else str(key))
+        except (sqlite3.Error, OSError) as e:
+            print(f"⚠️ Cache invalidation error: {e}")
+            self._error()
+
+    def _store(self):
+        store = self.open_store()
+        if store is None:
+            self._error()
+        return store
+
+    def _error(self):
+        with self._lock:
+            self.stats["errors"] += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            stats = dict(self.stats)
+            stats["l1_size"] = len(self._l1)
+        lookups = stats["l1_hits"] + stats["l2_hits"] + stats["misses"]
+        stats["hit_rate"] = round((stats["l1_hits"] + stats["l2_hits"]) / lookups, 4) if lookups else None
+        return stats
+
+
+_store = None
+_store_retry_at = 0.0
+_store_lock = threading.Lock()
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def _get_store():
+    """The shared store, opened on first use; None while it cannot be opened."""
+    global _store, _store_retry_at
+    if _store is not None:
+        return _store
+    with _store_lock:
+        if _store is None and time.monotonic() >= _store_retry_at:
+            try:
+                _store = SQLiteStore(CACHE_PATH)
+            except (sqlite3.Error, OSError) as e:
+                _store_retry_at = time.monotonic() + STORE_RETRY_SECONDS
+                print(f"⚠️ Cache store {CACHE_PATH} unavailable, using in-process cache only: {e}")
+        return _store
+
+
+def get_cache(namespace: str, ttl: float = 60.0) -> TieredCache:
+    with _caches_lock:
+        if namespace not in _caches:
+            _caches[namespace] = TieredCache(namespace, _get_store, ttl)
+        return _caches[namespace]
+
+
+def invalidate(namespace: str, key: str = None):
+    """
+    Invalidation hook for writers, e.g. db.db after an allocation. Clears the
+    shared entry even if this process never read the namespace itself.
+    """
+    with _caches_lock:
+        cache = _caches.get(namespace)
+    if cache is not None:
+        cache.invalidate(key)
+        return
+    store = _get_store()
+    if store is None:
+        return
+    try:
+        store.delete(namespace, None if key is None else str(key))
+    except (sqlite3.Error, OSError) as e:
+        print(f"⚠️ Cache invalidation error: {e}")
+
+
+def cache_stats() -> dict:
+    with _caches_lock:
+        caches = dict(_caches)
+    return {namespace: cache.snapshot() for namespace, cache in caches.items()}
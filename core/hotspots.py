@@ -0,0 +1,237 @@
+import datetime
+import math
+import os
+import threading
+import time
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE_LAT = 111.32
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = (math.sin((lat2 - lat1) / 2) ** 2
+         + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+class DayGrid:
+    """
+    Reports for one disaster on one day, bucketed into cells at least
+    `cell_km` wide. A radius query of `cell_km` only has to look at the
+    neighbouring rows and a few columns in each.
+    """
+
+    def __init__(self, cell_km: float):
+        self.cell_km = cell_km
+        self.lat_step = cell_km / KM_PER_DEGREE_LAT
+        self.cells = {}  # (row, col) -> [(request_id, lat, lon)]
+        self.request_ids = set()
+        self.last_request_id = 0  # highest id loaded from the DB
+        self.synced_at = None
+        self.syncing = False
+        self.retry_at = 0.0  # after a DB error, no top-up before this time
+
+    def lon_step(self, row: int) -> float:
+        # Use the poleward edge of the row so a cell is never narrower than cell_km
+        edge_lat = max(abs(row * self.lat_step), abs((row + 1) * self.lat_step))
+        return self.lat_step / max(math.cos(math.radians(min(edge_lat, 89.0))), 0.01)
+
+    def cell_of(self, lat: float, lon: float) -> tuple:
+        row = math.floor(lat / self.lat_step)
+        return row, math.floor(lon / self.lon_step(row))
+
+    def add(self, request_id, lat: float, lon: float) -> bool:
+        if request_id is not None:
+            if request_id in self.request_ids:
+                return False
+            self.request_ids.add(request_id)
+        self.cells.setdefault(self.cell_of(lat, lon), []).append((request_id, lat, lon))
+        return True
+
+    def neighbour_cells(self, lat: float, lon: float, radius_km: float):
+        row = math.floor(lat / self.lat_step)
+        reach = math.ceil(radius_km / self.cell_km)
+        dlon = radius_km / (KM_PER_DEGREE_LAT * max(math.cos(math.radians(min(abs(lat), 89.0))), 0.01))
+        for r in range(row - reach, row + reach + 1):
+            step = self.lon_step(r)
+            for c in range(math.floor((lon - dlon) / step), math.floor((lon + dlon) / step) + 1):
+                if (r, c) in self.cells:
+                    yield r, c
+
+    def adjacent_cells(self, cell: tuple):
+        row, col = cell
+        step = self.lon_step(row)
+        west, east = col * step, (col + 1) * step
+        for r in (row - 1, row, row + 1):
+            r_step = self.lon_step(r)
+            for c in range(math.floor(west / r_step) - 1, math.floor(east / r_step) + 2):
+                if (r, c) != cell and (r, c) in self.cells:
+                    yield r, c
+
+    def nearby(self, lat: float, lon: float, radius_km: float) -> list:
+        return [
+            point
+            for cell in self.neighbour_cells(lat, lon, radius_km)
+            for point in self.cells[cell]
+            if haversine_km(lat, lon, point[1], point[2]) <= radius_km
+        ]
+
+    def clusters(self, min_reports: int) -> list:
+        """Connected groups of occupied cells, largest first."""
+        seen = set()
+        clusters = []
+        for start in self.cells:
+            if start in seen:
+                continue
+            seen.add(start)
+            stack, members = [start], []
+            while stack:
+                cell = stack.pop()
+                members.append(cell)
+                for neighbour in self.adjacent_cells(cell):
+                    if neighbour not in seen:
+                        seen.add(neighbour)
+                        stack.append(neighbour)
+
+            points = [p for cell in members for p in self.cells[cell]]
+            if len(points) < min_reports:
+                continue
+            lats = [p[1] for p in points]
+            lons = [p[2] for p in points]
+            clusters.append({
+                "report_count": len(points),
+                "centroid": [sum(lats) / len(lats), sum(lons) / len(lons)],
+                "bbox": [min(lats), min(lons), max(lats), max(lons)],
+                "cells": len(members),
+            })
+        clusters.sort(key=lambda c: c["report_count"], reverse=True)
+        return clusters
+
+
+class HotspotIndex:
+    """
+    In-memory, incrementally updated picture of where today's reports are
+    clustering for each disaster. Reports are ingested at intake; each grid is
+    topped up from MySQL (only rows newer than the last one seen) when it is
+    first used and then every `resync_seconds`, so reports taken by other
+    worker processes are counted too. The top-up runs outside the lock, one
+    at a time per grid, and waits `error_backoff` seconds after a DB error;
+    lookups meanwhile answer from what the grid already holds. At most
+    `max_read_grids` grids per day are created by `hotspots` for disasters
+    this process has not seen a report for, so query strings cannot grow
+    the index without bound.
+    """
+
+    def __init__(self, cell_km: float = 10.0, resync_seconds: float = 60.0, loader=None,
+                 error_backoff: float = 5.0, max_read_grids: int = 64):
+        self.cell_km = cell_km
+        self.resync_seconds = resync_seconds
+        self.loader = loader
+        self.error_backoff = error_backoff
+        self.max_read_grids = max_read_grids
+        self._grids = {}  # (disaster_id, date) -> DayGrid
+        self._read_grids = set()  # keys created by `hotspots`
+        self._lock = threading.Lock()
+
+    def _grid(self, disaster_id: int, day: datetime.date) -> DayGrid:
+        key = (disaster_id, day)
+        grid = self._grids.get(key)
+        if grid is None:
+            # Past days are never queried again
+            for old_key in [k for k in self._grids if k[1] < day]:
+                del self._grids[old_key]
+                self._read_grids.discard(old_key)
+            grid = self._grids[key] = DayGrid(self.cell_km)
+        return grid
+
+    def _sync(self, disaster_id: int, day: datetime.date, grid: DayGrid):
+        # Called without the lock held; only the bookkeeping takes it
+        if self.loader is None:
+            return
+        with self._lock:
+            now = time.monotonic()
+            if grid.syncing or now < grid.retry_at:
+                return
+            if grid.synced_at is not None and now - grid.synced_at < self.resync_seconds:
+                return
+            grid.syncing = True
+            after_id = grid.last_request_id
+
+        rows = None
+        try:
+            rows = self.loader(disaster_id, day, after_id)
+        finally:
+            with self._lock:
+                grid.syncing = False
+                if rows is None:
+                    # DB error: keep what we have and back off before retrying
+                    grid.retry_at = time.monotonic() + self.error_backoff
+                else:
+                    for request_id, lat, lon in rows:
+                        grid.last_request_id = max(grid.last_request_id, request_id)
+                        if lat is not None and lon is not None:
+                            grid.add(request_id, float(lat), float(lon))
+                    grid.synced_at = time.monotonic()
+
+    def ingest(self, disaster_id: int, request_id, lat: float, lon: float, day: datetime.date = None):
+        day = day or datetime.date.today()
+        with self._lock:
+            self._grid(disaster_id, day).add(request_id, lat, lon)
+
+    def count_nearby(self, disaster_id: int, lat: float, lon: float,
+                     radius_km: float = 10.0, day: datetime.date = None) -> int:
+        day = day or datetime.date.today()
+        if disaster_id is None:
+            # Reports without a disaster id have nothing to be compared with
+            return 0
+        with self._lock:
+            grid = self._grid(disaster_id, day)
+            self._read_grids.discard((disaster_id, day))
+        self._sync(disaster_id, day, grid)
+        with self._lock:
+            return len(grid.nearby(lat, lon, radius_km))
+
+    def hotspots(self, disaster_id: int = None, min_reports: int = 1, day: datetime.date = None) -> list:
+        day = day or datetime.date.today()
+        with self._lock:
+            if disaster_id is not None and (disaster_id, day) not in self._grids:
+                if sum(1 for k in self._read_grids if k[1] == day) >= self.max_read_grids:
+                    return []
+                self._grid(disaster_id, day)
+                self._read_grids.add((disaster_id, day))
+            grids = [
+                (key, grid) for key, grid in self._grids.items()
+                if key[1] == day and (disaster_id is None or key[0] == disaster_id)
+            ]
+
+        # Top up what is returned, so every worker answers with the same
+        # picture (subject to resync_seconds and the error backoff)
+        for key, grid in grids:
+            self._sync(key[0], day, grid)
+
+        with self._lock:
+            return [
+                {"disasterId": key[0], "clusters": grid.clusters(min_reports)}
+                for key, grid in grids
+            ]
+
+
+def load_reports_since(disaster_id: int, day: datetime.date, after_id: int):
+    """(id, latitude, longitude) rows newer than `after_id`, or None on a DB error."""
+    # Imported lazily so the index itself has no DB dependency
+    from db.db import requests_for_day
+
+    res = requests_for_day(disaster_id, day, after_id)
+    if "error" in res:
+        return None
+    return res["disaster_data"]
+
+
+hotspot_index = HotspotIndex(
+    cell_km=float(os.getenv("HOTSPOT_CELL_KM", "10")),
+    resync_seconds=float(os.getenv("HOTSPOT_RESYNC_SECONDS", "60")),
+    loader=load_reports_since,
+    error_backoff=float(os.getenv("HOTSPOT_ERROR_BACKOFF_SECONDS", "5")),
+    max_read_grids=int(os.getenv("HOTSPOT_MAX_READ_GRIDS", "64")),
+)
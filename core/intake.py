@@ -0,0 +1,47 @@
+import re
+
+# Kept free of the workflow stack so the gateway can read a report's
+# severity for scheduling without importing core.agents.
+
+
+def parse_request_message(input_message: str) -> dict:
+    """Extract the structured request fields from a report message."""
+
+    # Helper function to extract values using regex
+    def extract(pattern, default=None):
+        match = re.search(pattern, input_message, re.IGNORECASE)
+        return match.group(1).strip() if match else default
+
+    # Extract all required fields
+    request_id = extract(r'Request Id: (\d+)', None)
+    disaster = extract(r'Disaster: (.+)', "Not applicable")
+    disaster_id = extract(r'Disaster ID: (\d+)', None)
+    severity_match = extract(r'Severity: (.+)', '').lower()
+    disaster_status = (
+        'critical' if 'critical' in severity_match else
+        'high' if 'high' in severity_match else
+        'medium' if 'medium' in severity_match else
+        'low' if 'low' in severity_match else
+        'Not applicable'
+    )
+    loc_match = re.search(r'Latitude ([\d.]+), Longitude ([\d.]+)', input_message, re.IGNORECASE)
+    location = [float(loc_match.group(1)), float(loc_match.group(2))] if loc_match else [0.0, 0.0]
+    affected_count = extract(r'Affected Count: (\d+)', 0)
+    contact_info = extract(r'Contact No: (.+)', "Not applicable")
+    image_path = extract(r'Image_path: (.+)', None)
+    voice_path = extract(r'Voice_path: (.+)', None)
+    text_description = extract(r'Details: (.+)', "Not applicable")
+
+    # Build the response JSON
+    return {
+        "request_id": int(request_id) if request_id else None,
+        "disaster": disaster,
+        "disaster_id": int(disaster_id) if disaster_id else None,
+        "disaster_status": disaster_status,
+        "location": location,
+        "affected_count": int(affected_count) if affected_count else 0,
+        "contact_info": contact_info,
+        "image_path": image_path,
+        "voice_path": voice_path,
+        "text_description": text_description
+    }
@@ -0,0 +1,313 @@
+import itertools
+import os
+import threading
+import time
+from dataclasses import dataclass
+
+from core.hotspots import haversine_km
+from db.records import Allocation, ResourceCenter
+
+
+class VersionConflict(Exception):
+    """A center changed since the caller read it."""
+
+    def __init__(self, resource_ids: list):
+        super().__init__(f"Stock changed for resource center(s) {resource_ids}")
+        self.resource_ids = resource_ids
+
+
+class CenterStock:
+    __slots__ = ("id", "resource_id", "count", "used", "reserved", "version", "lat", "long")
+
+    def __init__(self, id, resource_id, count, used, lat, long):
+        self.id = id
+        self.resource_id = resource_id
+        self.count = int(count or 0)
+        self.used = int(used or 0)
+        self.reserved = 0
+        self.version = 0
+        self.lat = float(lat)
+        self.long = float(long)
+
+    @property
+    def available(self) -> int:
+        return max(self.count - self.used - self.reserved, 0)
+
+
+@dataclass(frozen=True, slots=True)
+class Reservation:
+    id: int
+    request_id: int
+    items: tuple  # ((resource_id, amount), ...)
+
+
+class InventoryLedger:
+    """
+    Authoritative in-process view of resource center stock.
+
+    Stock is loaded from resource_centers and kept current by
+    reserve/commit/release, so the allocation stage never reads MySQL.
+    Every change bumps the center's version; `reserve` can check the
+    versions the caller planned against (optimistic concurrency), and a
+    stale plan is handed back to the caller to re-plan rather than applied
+    to stock it was not made for. `commit`
+    persists through the conditional UPDATE in db.db, which is what keeps
+    several worker processes from over-allocating; on a conflict there the
+    ledger reloads and the allocation is retried. A periodic reload, run by
+    `nearby` outside the lock, picks up other workers' commits.
+    """
+
+    def __init__(self, loader=None, persister=None, reload_seconds: float = 30.0,
+                 error_backoff: float = 5.0, first_load_timeout: float = 10.0):
+        self.loader = loader
+        self.persister = persister
+        self.reload_seconds = reload_seconds
+        self.error_backoff = error_backoff
+        self.first_load_timeout = first_load_timeout
+        self._centers = {}  # resource_id -> CenterStock
+        self._reservations = {}
+        self._ids = itertools.count(1)
+        self._loaded_at = None
+        self._loading = False
+        self._loads_started = 0
+        self._retry_at = 0.0
+        self._first_load = threading.Event()
+        self._lock = threading.Lock()
+        self.stats = {"reserved": 0, "committed": 0, "released": 0, "version_conflicts": 0,
+                      "persist_conflicts": 0, "reloads": 0, "load_errors": 0}
+
+    def _reload(self, force: bool = False):
+        """Re-read stock if it is due. The DB read happens without the lock."""
+        if self.loader is None:
+            return
+        with self._lock:
+            now = time.monotonic()
+            if self._loading:
+                first_load_pending = not self._first_load.is_set()
+            elif now < self._retry_at:
+                return
+            elif not force and self._loaded_at is not None and now - self._loaded_at < self.reload_seconds:
+                return
+            else:
+                first_load_pending = None
+                self._loading = True
+                self._loads_started += 1
+        if first_load_pending is not None:
+            # Another thread is loading; wait for it only if there is nothing to answer from yet
+            if first_load_pending:
+                self._first_load.wait(self.first_load_timeout)
+            return
+
+        rows = None
+        try:
+            rows = self.loader()
+        except Exception as e:
+            print(f"⚠️ Inventory load error: {e}")
+        finally:
+            with self._lock:
+                self._loading = False
+                if rows is None:
+                    # DB error: keep serving the current view, retry after a pause
+                    self._retry_at = time.monotonic() + self.error_backoff
+                    self.stats["load_errors"] += 1
+                else:
+                    self._apply(rows)
+                    self._loaded_at = time.monotonic()
+                    self.stats["reloads"] += 1
+                    self._first_load.set()
+
+    def _apply(self, rows):
+        # Callers hold the lock
+        centers = {}
+        for row in rows:
+            if row[4] is None or row[5] is None:
+                print(f"⚠️ Resource center {row[1]} has no location, leaving it out")
+                continue
+            center = CenterStock(*row)
+            old = self._centers.get(center.resource_id)
+            if old is not None:
+                # Reservations in flight are ours, the DB does not know them yet
+                center.reserved = old.reserved
+                center.version = old.version + (old.used != center.used or old.count != center.count)
+            centers[center.resource_id] = center
+        self._centers = centers
+
+    def load(self, rows):
+        """Replace the ledger contents with (id, resourceId, count, used, lat, long) rows."""
+        with self._lock:
+            self._centers = {}
+            self._apply(rows)
+            self._loaded_at = time.monotonic()
+            self._first_load.set()
+
+    def nearby(self, lat: float, lon: float, radius_km: float = 10.0):
+        """
+        Centers within `radius_km` as ResourceCenter records (`used` includes
+        in-flight reservations) plus their versions, nearest first.
+        """
+        self._reload()
+        with self._lock:
+            found = []
+            versions = {}
+            for center in self._centers.values():
+                distance = haversine_km(lat, lon, center.lat, center.long)
+                if distance <= radius_km:
+                    found.append(ResourceCenter(
+                        center.id, center.resource_id, center.count,
+                        center.used + center.reserved, center.lat, center.long, distance * 1000
+                    ))
+                    versions[center.resource_id] = center.version
+        found.sort(key=lambda c: c.distance)
+        return found, versions
+
+    def reserve(self, request_id: int, items: list, expected_versions: dict = None) -> Reservation:
+        """
+        Atomically set aside stock for `items` [(resource_id, amount)].
+        Amounts are clamped to what is available; unknown centers and zero
+        amounts are dropped. Raises VersionConflict if a center changed since
+        `expected_versions` and no longer has the amount asked of it, i.e.
+        when the plan would only be applied by shrinking it. Never reads the DB.
+        """
+        with self._lock:
+            if expected_versions:
+                stale = [
+                    resource_id for resource_id, amount in items
+                    if resource_id in self._centers
+                    and self._centers[resource_id].version != expected_versions.get(resource_id)
+                    and int(amount or 0) > self._centers[resource_id].available
+                ]
+                if stale:
+                    self.stats["version_conflicts"] += 1
+                    raise VersionConflict(stale)
+
+            granted = {}
+            for resource_id, amount in items:
+                center = self._centers.get(resource_id)
+                if center is None:
+                    continue
+                amount = min(int(amount or 0), center.available)
+                if amount <= 0:
+                    continue
+                center.reserved += amount
+                center.version += 1
+                granted[resource_id] = granted.get(resource_id, 0) + amount
+
+            reservation = Reservation(next(self._ids), request_id, tuple(granted.items()))
+            self._reservations[reservation.id] = reservation
+            if granted:
+                self.stats["reserved"] += 1
+            return reservation
+
+    def release(self, reservation: Reservation):
+        with self._lock:
+            if self._reservations.pop(reservation.id, None) is None:
+                return
+            for resource_id, amount in reservation.items:
+                center = self._centers.get(resource_id)
+                if center is not None:
+                    center.reserved = max(center.reserved - amount, 0)
+                    center.version += 1
+            if reservation.items:
+                self.stats["released"] += 1
+
+    def commit(self, reservation: Reservation) -> dict:
+        """Persist a reservation. The reservation is released if persisting fails."""
+        if not reservation.items:
+            self.release(reservation)
+            return {"error": "No stock available at the selected resource centers.", "results": {}}
+
+        resource_ids = [resource_id for resource_id, _ in reservation.items]
+        amounts = [amount for _, amount in reservation.items]
+        with self._lock:
+            loads_before = self._loads_started
+        try:
+            res = self.persister(reservation.request_id, resource_ids, amounts) if self.persister else {
+                "status": "success",
+                "results": [Allocation(reservation.request_id, r, a) for r, a in reservation.items],
+            }
+        except Exception as e:
+            print(f"⚠️ Allocation persist error: {e}")
+            res = {"error": str(e), "results": {}}
+
+        with self._lock:
+            if self._reservations.pop(reservation.id, None) is None:
+                return {"error": "Reservation already released.", "results": {}}
+            # A reload that started while we were persisting may already have
+            # read the new `used` from the DB; adding it again would count it
+            # twice. If it read too early instead, the next DB conflict or
+            # reload corrects it, and the DB guard never lets stock go negative.
+            count_used = res.get("status") == "success" and self._loads_started == loads_before
+            for resource_id, amount in reservation.items:
+                center = self._centers.get(resource_id)
+                if center is None:
+                    continue
+                center.reserved = max(center.reserved - amount, 0)
+                if count_used:
+                    center.used += amount
+                center.version += 1
+
+            if res.get("status") == "success":
+                self.stats["committed"] += 1
+            else:
+                self.stats["released"] += 1
+                if res.get("conflict_ids"):
+                    self.stats["persist_conflicts"] += 1
+        return res
+
+    def allocate(self, request_id: int, items: list, expected_versions: dict = None, retries: int = 3) -> dict:
+        """
+        reserve + commit. A version conflict means the plan was made on stock
+        that has since been taken: nothing is reserved and the result carries "version_conflict",
+        so the caller can re-plan against `nearby`. A DB conflict, where
+        another process took the stock, makes the ledger re-read MySQL and
+        retry the same plan, clamped to what is left, up to `retries` times.
+        """
+        try:
+            reservation = self.reserve(request_id, items, expected_versions)
+        except VersionConflict as e:
+            print(f"⚠️ {e}")
+            return {"error": str(e), "conflict_ids": e.resource_ids, "version_conflict": True, "results": {}}
+
+        res = {"error": "Allocation was not attempted.", "results": {}}
+        for attempt in range(retries):
+            if attempt:
+                reservation = self.reserve(request_id, items)
+            res = self.commit(reservation)
+            if not res.get("conflict_ids"):
+                return res
+            self._reload(force=True)
+        return res
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "centers": len(self._centers),
+                "reserved_units": sum(c.reserved for c in self._centers.values()),
+                "open_reservations": len(self._reservations),
+                "loaded": self._loaded_at is not None,
+                **self.stats,
+            }
+
+
+def load_inventory():
+    # Imported lazily so the ledger itself has no DB dependency
+    from db.db import inventory_fetch
+
+    res = inventory_fetch()
+    if res.get("status") != "success":
+        return None
+    return res["centers"]
+
+
+def persist_allocation(request_id: int, resource_ids: list, amounts: list) -> dict:
+    from db.db import assign_resources
+
+    return assign_resources(request_id, resource_ids, amounts)
+
+
+inventory = InventoryLedger(
+    loader=load_inventory,
+    persister=persist_allocation,
+    reload_seconds=float(os.getenv("INVENTORY_RELOAD_SECONDS", "30")),
+    error_backoff=float(os.getenv("INVENTORY_ERROR_BACKOFF_SECONDS", "5")),
+)
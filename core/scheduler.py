@@ -0,0 +1,382 @@
+import asyncio
+import heapq
+import itertools
+import math
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from contextlib import asynccontextmanager
+
+from core.admission import AdmissionRejected
+
+LANES = ("critical", "high", "medium", "low")
+LANE_RANK = {lane: rank for rank, lane in enumerate(LANES)}
+
+# Within a disaster each affected person moves a report ahead as if it had
+# been queued AFFECTED_BOOST_SECONDS earlier, up to AFFECTED_CAP people, so
+# a small report waits at most AFFECTED_CAP * AFFECTED_BOOST_SECONDS behind
+# bigger ones that arrive after it
+AFFECTED_CAP = 100
+
+
+def lane_for(severity: str) -> str:
+    severity = (severity or "").lower()
+    # Reports without a usable severity are treated as medium, not starved
+    return severity if severity in LANE_RANK else "medium"
+
+
+class Job:
+    __slots__ = ("fn", "args", "future", "lane", "disaster_id", "affected_count", "enqueued_at", "taken")
+
+    def __init__(self, fn, args, lane, disaster_id, affected_count, future=None):
+        self.fn = fn
+        self.args = args
+        self.future = future or Future()
+        self.lane = lane
+        self.disaster_id = disaster_id
+        self.affected_count = affected_count
+        self.enqueued_at = time.monotonic()
+        self.taken = False
+
+
+class Lane:
+    """
+    One severity lane. Jobs are grouped per disasterId and served round
+    robin across disasters, so one large event cannot starve the others.
+    Within a disaster, jobs are ordered by enqueue time moved earlier by
+    `affected_boost` seconds per affected person: bigger reports go first,
+    but every report eventually reaches the front.
+    """
+
+    def __init__(self, name: str, affected_boost: float = 0.3):
+        self.name = name
+        self.affected_boost = affected_boost
+        self.disasters = OrderedDict()  # disaster_id -> heap of (deadline, seq, job)
+        self.arrivals = deque()  # every queued job in enqueue order, taken ones dropped lazily
+        self.depth = 0
+        self.submitted = 0
+        self.completed = 0
+        self.waits = deque(maxlen=500)
+        self._seq = itertools.count()
+
+    def push(self, job: Job):
+        deadline = job.enqueued_at - self.affected_boost * min(job.affected_count, AFFECTED_CAP)
+        heap = self.disasters.setdefault(job.disaster_id, [])
+        heapq.heappush(heap, (deadline, next(self._seq), job))
+        self.arrivals.append(job)
+        self.depth += 1
+        self.submitted += 1
+
+    def oldest_wait(self, now: float) -> float:
+        # Age of the oldest job anywhere in the lane, not just the next one out
+        if not self.depth:
+            return 0.0
+        return now - self.arrivals[0].enqueued_at
+
+    def pop(self) -> Job:
+        disaster_id, heap = next(iter(self.disasters.items()))
+        job = heapq.heappop(heap)[2]
+        if heap:
+            self.disasters.move_to_end(disaster_id)
+        else:
+            del self.disasters[disaster_id]
+        self._taken(job)
+        return job
+
+    def remove(self, job: Job):
+        """Take a job out of the queue without running it, e.g. after a timeout."""
+        heap = self.disasters.get(job.disaster_id)
+        entry = next((e for e in heap or () if e[2] is job), None)
+        if entry is None:
+            return
+        heap.remove(entry)
+        if heap:
+            heapq.heapify(heap)
+        else:
+            del self.disasters[job.disaster_id]
+        self._taken(job)
+
+    def _taken(self, job: Job):
+        job.taken = True
+        while self.arrivals and self.arrivals[0].taken:
+            self.arrivals.popleft()
+        self.depth -= 1
+
+    def snapshot(self, now: float) -> dict:
+        waits = sorted(self.waits)
+        return {
+            "depth": self.depth,
+            "disasters": len(self.disasters),
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "oldest_wait_seconds": round(self.oldest_wait(now), 3),
+            "avg_wait_seconds": round(sum(waits) / len(waits), 3) if waits else None,
+            "p95_wait_seconds": round(waits[min(len(waits) - 1, math.ceil(len(waits) * 0.95) - 1)], 3) if waits else None,
+            "max_wait_seconds": round(waits[-1], 3) if waits else None,
+        }
+
+
+def next_lane(lanes: dict, critical_only: bool, aging_seconds: float):
+    """The lane to serve next: lowest rank, minus one rank per `aging_seconds` waited."""
+    now = time.monotonic()
+    best, best_score = None, None
+    for name in LANES:
+        lane = lanes[name]
+        if not lane.depth:
+            continue
+        if critical_only and name != "critical":
+            break
+        score = LANE_RANK[name] - lane.oldest_wait(now) / aging_seconds
+        if best_score is None or score < best_score:
+            best, best_score = lane, score
+    return best
+
+
+class WorkflowScheduler:
+    """
+    Runs workflows on a fixed pool of workers, picking the next job by
+    severity lane with aging: a job's lane rank drops by one for every
+    `aging_seconds` it has waited, so low-priority reports still finish.
+    `critical_workers` of the workers only take critical jobs, which keeps
+    critical latency bounded while the rest are busy on slow model calls.
+    Inside a lane, a report can be overtaken by bigger reports of the same
+    disaster for at most `aging_seconds`. `run` gives up on a job that is
+    still queued after `queue_timeout` seconds.
+    """
+
+    def __init__(self, workers: int, critical_workers: int, max_queue: int,
+                 critical_queue: int, aging_seconds: float, queue_timeout: float):
+        self.workers = workers
+        self.critical_workers = min(critical_workers, workers)
+        self.max_queue = max_queue
+        self.critical_queue = critical_queue
+        self.aging_seconds = aging_seconds
+        self.queue_timeout = queue_timeout
+        self.lanes = {name: Lane(name, aging_seconds / AFFECTED_CAP) for name in LANES}
+        self.running = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self._durations = deque(maxlen=50)
+        self._cond = threading.Condition()
+        self._threads = []
+
+    def _start(self):
+        # Workers are started on first use so importing the module stays cheap
+        for i in range(self.workers):
+            critical_only = i < self.critical_workers
+            thread = threading.Thread(
+                target=self._worker, args=(critical_only,),
+                name=f"workflow-{'critical' if critical_only else 'worker'}-{i}", daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+
+    def _retry_after(self) -> int:
+        avg = sum(self._durations) / len(self._durations) if self._durations else 1.0
+        queued = sum(lane.depth for lane in self.lanes.values())
+        return max(1, math.ceil(avg * (queued + 1) / self.workers))
+
+    def submit(self, fn, *args, severity: str = None, disaster_id=None, affected_count: int = 0) -> Future:
+        return self._enqueue(fn, args, severity, disaster_id, affected_count).future
+
+    def run(self, fn, *args, severity: str = None, disaster_id=None, affected_count: int = 0):
+        """
+        Submit and wait for the result. Raises AdmissionRejected when the
+        queue is full or the job is not picked within `queue_timeout`; once
+        a worker has started it, the job is waited for to the end.
+        """
+        job = self._enqueue(fn, args, severity, disaster_id, affected_count)
+        try:
+            return job.future.result(timeout=self.queue_timeout)
+        except FutureTimeoutError:
+            with self._cond:
+                if not job.taken:
+                    self.lanes[job.lane].remove(job)
+                    job.future.cancel()
+                    self.timed_out += 1
+                    raise AdmissionRejected(self._retry_after())
+        return job.future.result()
+
+    def _enqueue(self, fn, args, severity, disaster_id, affected_count) -> Job:
+        lane_name = lane_for(severity)
+        job = Job(fn, args, lane_name, disaster_id, affected_count or 0)
+
+        with self._cond:
+            if not self._threads:
+                self._start()
+
+            if lane_name == "critical":
+                full = self.lanes["critical"].depth >= self.critical_queue
+            else:
+                full = sum(self.lanes[name].depth for name in LANES[1:]) >= self.max_queue
+            if full:
+                self.rejected += 1
+                raise AdmissionRejected(self._retry_after())
+
+            self.lanes[lane_name].push(job)
+            self._cond.notify_all()
+        return job
+
+    def _next_lane(self, critical_only: bool):
+        return next_lane(self.lanes, critical_only, self.aging_seconds)
+
+    def _worker(self, critical_only: bool):
+        while True:
+            with self._cond:
+                lane = self._next_lane(critical_only)
+                while lane is None:
+                    self._cond.wait()
+                    lane = self._next_lane(critical_only)
+                job = lane.pop()
+                lane.waits.append(time.monotonic() - job.enqueued_at)
+                self.running += 1
+
+            if job.future.set_running_or_notify_cancel():
+                start = time.monotonic()
+                try:
+                    job.future.set_result(job.fn(*job.args))
+                except BaseException as e:
+                    job.future.set_exception(e)
+                duration = time.monotonic() - start
+            else:
+                duration = 0.0
+
+            with self._cond:
+                self.running -= 1
+                lane.completed += 1
+                self._durations.append(duration)
+
+    def snapshot(self) -> dict:
+        now = time.monotonic()
+        with self._cond:
+            return {
+                "workers": self.workers,
+                "critical_workers": self.critical_workers,
+                "running": self.running,
+                "rejected": self.rejected,
+                "timed_out": self.timed_out,
+                "lanes": {name: lane.snapshot(now) for name, lane in self.lanes.items()},
+            }
+
+
+class AsyncWorkflowScheduler:
+    """
+    The same lanes, fairness, aging and reserved critical capacity for the
+    ASGI gateway, where a workflow is a coroutine instead of a thread.
+    `admit` waits until the job is picked for one of `slots` in-flight
+    places; `critical_slots` of them are only given to critical jobs.
+    Everything runs on the event loop, so no lock is needed.
+    """
+
+    def __init__(self, slots: int, critical_slots: int, max_queue: int,
+                 critical_queue: int, aging_seconds: float, queue_timeout: float):
+        self.slots = slots
+        self.critical_slots = min(critical_slots, slots)
+        self.max_queue = max_queue
+        self.critical_queue = critical_queue
+        self.aging_seconds = aging_seconds
+        self.queue_timeout = queue_timeout
+        self.lanes = {name: Lane(name, aging_seconds / AFFECTED_CAP) for name in LANES}
+        self.running = 0
+        self.critical_running = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self._durations = deque(maxlen=50)
+
+    def _retry_after(self) -> int:
+        avg = sum(self._durations) / len(self._durations) if self._durations else 1.0
+        queued = sum(lane.depth for lane in self.lanes.values())
+        return max(1, math.ceil(avg * (queued + 1) / self.slots))
+
+    def _reject(self):
+        self.rejected += 1
+        return AdmissionRejected(self._retry_after())
+
+    def _dispatch(self):
+        while self.running < self.slots:
+            # Non-critical jobs may not take the reserved slots
+            critical_only = self.running - self.critical_running >= self.slots - self.critical_slots
+            lane = next_lane(self.lanes, critical_only, self.aging_seconds)
+            if lane is None:
+                return
+            job = lane.pop()
+            lane.waits.append(time.monotonic() - job.enqueued_at)
+            self.running += 1
+            self.critical_running += job.lane == "critical"
+            job.future.set_result(None)
+
+    def _release(self, job: Job, duration: float):
+        self.running -= 1
+        self.critical_running -= job.lane == "critical"
+        self.lanes[job.lane].completed += 1
+        self._durations.append(duration)
+        self._dispatch()
+
+    @asynccontextmanager
+    async def admit(self, severity: str = None, disaster_id=None, affected_count: int = 0):
+        lane_name = lane_for(severity)
+        job = Job(None, (), lane_name, disaster_id, affected_count or 0,
+                  future=asyncio.get_running_loop().create_future())
+
+        if lane_name == "critical":
+            full = self.lanes["critical"].depth >= self.critical_queue
+        else:
+            full = sum(self.lanes[name].depth for name in LANES[1:]) >= self.max_queue
+        if full:
+            raise self._reject()
+
+        self.lanes[lane_name].push(job)
+        self._dispatch()
+        try:
+            await asyncio.wait_for(asyncio.shield(job.future), self.queue_timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if job.future.done():
+                # Picked at the last moment: hand the slot on
+                self._release(job, 0.0)
+            else:
+                self.lanes[lane_name].remove(job)
+                job.future.cancel()
+            if isinstance(e, asyncio.TimeoutError):
+                self.timed_out += 1
+                raise self._reject()
+            raise
+
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self._release(job, time.monotonic() - start)
+
+    def snapshot(self) -> dict:
+        now = time.monotonic()
+        return {
+            "slots": self.slots,
+            "critical_slots": self.critical_slots,
+            "running": self.running,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "lanes": {name: lane.snapshot(now) for name, lane in self.lanes.items()},
+        }
+
+
+workflow_scheduler = WorkflowScheduler(
+    workers=int(os.getenv("ADMISSION_MAX_IN_FLIGHT", "8")),
+    critical_workers=int(os.getenv("SCHEDULER_CRITICAL_WORKERS", "1")),
+    max_queue=int(os.getenv("ADMISSION_MAX_QUEUE", "32")),
+    critical_queue=int(os.getenv("SCHEDULER_CRITICAL_QUEUE", "16")),
+    aging_seconds=float(os.getenv("SCHEDULER_AGING_SECONDS", "30")),
+    queue_timeout=float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "10")),
+)
+
+# The ASGI gateway holds a workflow as a coroutine, so it can keep far more
+# of them in flight than the Flask worker threads
+async_workflow_scheduler = AsyncWorkflowScheduler(
+    slots=int(os.getenv("ASGI_MAX_IN_FLIGHT", "500")),
+    critical_slots=int(os.getenv("ASGI_CRITICAL_SLOTS", "50")),
+    max_queue=int(os.getenv("ASGI_MAX_QUEUE", "1000")),
+    critical_queue=int(os.getenv("ASGI_CRITICAL_QUEUE", "200")),
+    aging_seconds=float(os.getenv("SCHEDULER_AGING_SECONDS", "30")),
+    queue_timeout=float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "10")),
+)
@@ -0,0 +1,42 @@
+import importlib
+import threading
+import time
+
+# The gateways import the workflow stack (langgraph, pydantic, mysql, the
+# agents) on the first /api/agent request. A new worker can instead load it
+# in the background right after start-up, while it already answers cheap
+# routes, so the first real report does not pay for the imports.
+
+_state = {"state": "idle", "target": None, "seconds": None, "error": None}
+_lock = threading.Lock()
+
+
+def _warm_up(target: str):
+    start = time.monotonic()
+    try:
+        module = importlib.import_module(target)
+        get_workflow = getattr(module, "get_workflow", None) or getattr(module, "get_async_workflow", None)
+        if get_workflow is not None:
+            get_workflow()
+        state, error = "done", None
+    except Exception as e:
+        print(f"⚠️ Warm-up of {target} failed: {e}")
+        state, error = "failed", str(e)
+    with _lock:
+        _state.update(state=state, seconds=round(time.monotonic() - start, 3), error=error)
+    print(f"🔥 Warm-up of {target}: {state} in {_state['seconds']}s")
+
+
+def start_warmup(target: str = "core.agents") -> bool:
+    """Import `target` and compile its workflow on a daemon thread. Runs once."""
+    with _lock:
+        if _state["state"] != "idle":
+            return False
+        _state.update(state="running", target=target)
+    threading.Thread(target=_warm_up, args=(target,), name="workflow-warmup", daemon=True).start()
+    return True
+
+
+def warmup_snapshot() -> dict:
+    with _lock:
+        return dict(_state)
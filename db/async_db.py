@@ -0,0 +1,108 @@
+import asyncio
+import os
+from contextlib import asynccontextmanager
+
+import mysql.connector
+from mysql.connector.aio import connect
+
+from db.db import (
+    DB_CONFIG,
+    UPDATE_REQUEST_IN_PROGRESS,
+    UPDATE_REQUEST_VERIFIED,
+)
+
+# Async counterparts of the db.db writes the async agents await. They
+# return the same results so the async agents can treat results exactly
+# like the blocking versions. Stock reads and allocations go through
+# core.inventory, which persists via db.db from a worker thread.
+
+# Hundreds of workflows can be in flight on the ASGI server; keep the
+# number of open MySQL connections well under max_connections (151 by default)
+ASYNC_DB_MAX_CONNECTIONS = int(os.getenv("ASYNC_DB_MAX_CONNECTIONS", "32"))
+
+_connection_slots = asyncio.Semaphore(ASYNC_DB_MAX_CONNECTIONS)
+
+
+@asynccontextmanager
+async def db_connection():
+    async with _connection_slots:
+        conn = await connect(**DB_CONFIG)
+        try:
+            yield conn
+        finally:
+            await conn.close()
+
+
+async def update_request_status(request_id: int, status: str):
+
+    # Only handle 'verified' status
+    if status.lower() != "verified":
+        print("Status is not 'verified', no update performed.")
+        return False
+
+    try:
+        async with db_connection() as conn:
+            cursor = await conn.cursor(dictionary=True)
+
+            await cursor.execute(UPDATE_REQUEST_VERIFIED, (True, request_id))
+            await conn.commit()
+            updated = cursor.rowcount > 0
+
+            await cursor.close()
+
+        if updated:
+            print(f"Request ID {request_id} updated successfully to verified.")
+        else:
+            print(f"No request found with ID {request_id}.")
+        return updated
+
+    except mysql.connector.Error as err:
+        print(f"Database error: {err}")
+        return {
+            "error": str(err),
+            "results": {}
+        }
+    except Exception as e:
+        print(f"Unexpected error: {e}")
+        return {
+            "error": str(e),
+            "results": {}
+        }
+
+
+async def change_status_after_assign_resources(request_id: int, status: str) -> dict:
+    """
+    Change the status of a disaster request.
+    """
+    if status.lower() != "success":
+        return {
+            "error": f"Invalid status '{status}'. Only 'success' allocations are allowed.",
+            "results": {}
+        }
+
+    try:
+        async with db_connection() as conn:
+            cursor = await conn.cursor(dictionary=True)
+
+            await cursor.execute(UPDATE_REQUEST_IN_PROGRESS, (request_id,))
+            await conn.commit()
+
+            await cursor.close()
+
+        return {
+            "status": "IN_PROGRESS",
+            "message": f"Status of disaster request {request_id} changed to '{status}'."
+        }
+
+    except mysql.connector.Error as err:
+        print(f"Database error: {err}")
+        return {
+            "error": str(err),
+            "results": {}
+        }
+    except Exception as e:
+        print(f"Unexpected error: {e}")
+        return {
+            "error": str(e),
+            "results": {}
+        }
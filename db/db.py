@@ -1,121 +1,237 @@
 import datetime
+import os
 import mysql.connector
 
-
-def resource_fetch(request_id: int) -> dict:
+from core.cache import get_cache, invalidate
+from db.records import Allocation
+
+DB_CONFIG = {
+    "host": "localhost",
+    "user": "root",
+    "password": "",
+    "database": "survivorsync"
+}
+
+# Statements used by both layers are shared with db.async_db. Hot reads
+# (hotspot top-up, inventory) use plain tuple cursors, not dictionary ones.
+SELECT_REQUEST_EXISTS = "SELECT id FROM disaster_requests WHERE id = %s"
+
+# The hotspot index tops up from this query, which is the only read of
+# disaster_requests verification still does. It is answered from
+# idx_requests_disaster_day (disasterId, created_at, latitude, longitude)
+# alone, see db/migrations: InnoDB appends the primary key, so id is there too.
+REQUESTS_DAY_INDEX = "idx_requests_disaster_day"
+
+SELECT_REQUESTS_FOR_DAY_AFTER_ID = """
+    SELECT id, latitude, longitude FROM disaster_requests
+    WHERE disasterId = %s
+    AND created_at >= %s AND created_at < %s
+    AND id > %s
+"""
+
+# Past days are never read by the workflow again; they are moved to
+# disaster_requests_archive in id order, one batch per transaction. A request
+# that still has a live allocation (isAllocated = TRUE) stays where it is;
+# released allocations move to allocated_resources_archive with their request,
+# so the delete never depends on the foreign key's ON DELETE rule.
+SELECT_REQUESTS_TO_ARCHIVE = """
+    SELECT dr.id FROM disaster_requests dr
+    WHERE dr.created_at < %s AND dr.id > %s
+    AND NOT EXISTS (
+        SELECT 1 FROM allocated_resources ar
+        WHERE ar.disasterRequestId = dr.id AND ar.isAllocated = TRUE
+    )
+    ORDER BY dr.id LIMIT %s
+    FOR UPDATE
+"""
+
+ARCHIVE_ALLOCATIONS = "INSERT IGNORE INTO allocated_resources_archive SELECT * FROM allocated_resources WHERE disasterRequestId IN ({ids})"
+
+DELETE_ARCHIVED_ALLOCATIONS = "DELETE FROM allocated_resources WHERE disasterRequestId IN ({ids})"
+
+ARCHIVE_REQUESTS = "INSERT IGNORE INTO disaster_requests_archive SELECT * FROM disaster_requests WHERE id IN ({ids})"
+
+DELETE_ARCHIVED_REQUESTS = "DELETE FROM disaster_requests WHERE id IN ({ids})"
+
+UPDATE_REQUEST_VERIFIED = "UPDATE disaster_requests SET isVerified = %s WHERE id = %s"
+
+INSERT_ALLOCATION = """
+    INSERT INTO allocated_resources (disasterRequestId, resourceCenterId, amount, isAllocated)
+    VALUES (%s, %s, %s, %s)
+"""
+
+UPDATE_REQUEST_IN_PROGRESS = "UPDATE disaster_requests SET status = 'IN_PROGRESS' WHERE id = %s"
+
+# How much of a center's stock is taken. The ledger and the cross-process
+# guard must agree on it; allocations made before `used` was maintained are
+# folded into the column by db/migrations/002.
+USED_STOCK = "COALESCE(used, 0)"
+
+# Stock per center for core.inventory
+SELECT_INVENTORY = f"""
+    SELECT id, resourceId, `count`, {USED_STOCK} AS used, lat, `long`
+    FROM resource_centers
+"""
+
+# Only succeeds while the center still has the stock, so concurrent
+# allocators in other processes can never push `used` past `count`
+RESERVE_STOCK = f"""
+    UPDATE resource_centers SET used = {USED_STOCK} + %s
+    WHERE resourceId = %s AND {USED_STOCK} + %s <= `count`
+"""
+
+
+# Stock of all centers, shared by every worker's inventory ledger so a
+# reload costs one query per host, not one per process. Writers
+# drop it through the core.cache invalidation hook.
+STOCK_CACHE = "inventory"
+STOCK_CACHE_KEY = "stock"
+STOCK_CACHE_TTL = float(os.getenv("STOCK_CACHE_TTL", "5"))
+
+
+def day_range(now: datetime.datetime) -> tuple:
+    """Start of the given day and start of the next one."""
+    today_start = datetime.datetime.combine(now.date(), datetime.time.min)
+    return today_start, today_start + datetime.timedelta(days=1)
+
+
+def requests_for_day(disaster_id: int, day: datetime.date, after_id: int = 0) -> dict:
     """
-    Track resources based on location for a single disaster request ID.
-    Returns nearby resource centers (within 10 km).
+    Locations of a disaster's requests created on `day` with an id above `after_id`,
+    as (id, latitude, longitude) tuples. Used to top up the in-memory hotspot index.
     """
     try:
-        conn = mysql.connector.connect(
-            host="localhost",
-            user="root",
-            password="",
-            database="survivorsync"
-        )
-        cursor = conn.cursor(dictionary=True)
+        day_start, day_end = day_range(datetime.datetime.combine(day, datetime.time.min))
 
-        # Get the disaster request
-        cursor.execute("SELECT * FROM disaster_requests WHERE id = %s", (request_id,))
-        disaster = cursor.fetchone()
+        conn = mysql.connector.connect(**DB_CONFIG)
+        cursor = conn.cursor()
 
-        if not disaster:
-            return {
-                "error": f"No disaster request found with ID {request_id}",
-                "results": {}
-            }
+        cursor.execute(SELECT_REQUESTS_FOR_DAY_AFTER_ID, (disaster_id, day_start, day_end, after_id))
+        disaster_data = cursor.fetchall()
 
-        lat = disaster.get("latitude")
-        lon = disaster.get("longitude")
+        cursor.close()
+        conn.close()
 
-        if lat is None or lon is None:
-            return {
-                "disaster": disaster,
-                "resources": [],
-                "error": "Missing latitude or longitude for disaster request"
-            }
+        return {
+            "disaster_data": disaster_data,
+            "message": f"Found {len(disaster_data)} new requests for disaster ID {disaster_id} on {day}."
+        }
+    except mysql.connector.Error as err:
+        print(f"Database error: {err}")
+        return {
+            "error": f"Database error: {err}"
+        }
+    except Exception as e:
+        print(f"Unexpected error: {e}")
+        return {
+            "error": f"Unexpected error: {e}"
+        }
 
-        # Find nearby resource centers within 10km
-        # Find nearby resource centers within 10km (uses correct column names)
-        resource_query = """
-            SELECT *, 
-            ST_Distance_Sphere(POINT(`long`, `lat`), POINT(%s, %s)) AS distance
-            FROM resource_centers
-            WHERE ST_Distance_Sphere(POINT(`long`, `lat`), POINT(%s, %s)) <= 10000
-        """
-        cursor.execute(resource_query, (lon, lat, lon, lat))
-        resources = cursor.fetchall()
+
+def archive_requests_before(cutoff: datetime.date, batch_size: int = 5000) -> dict:
+    """
+    Move requests created before `cutoff`, and their released allocations,
+    to the archive tables. Requests with live allocations are skipped. Each
+    batch is its own transaction, so the live tables are never locked for
+    long and an interrupted run can simply be started again.
+    """
+    try:
+        cutoff_start = datetime.datetime.combine(cutoff, datetime.time.min)
+
+        conn = mysql.connector.connect(**DB_CONFIG)
+        cursor = conn.cursor()
+
+        archived = 0
+        last_id = 0
+        while True:
+            cursor.execute(SELECT_REQUESTS_TO_ARCHIVE, (cutoff_start, last_id, batch_size))
+            ids = [row[0] for row in cursor.fetchall()]
+            if not ids:
+                conn.commit()
+                break
+            last_id = ids[-1]
+
+            placeholders = ", ".join(["%s"] * len(ids))
+            # Children first, so a RESTRICT foreign key never sees an orphan
+            cursor.execute(ARCHIVE_ALLOCATIONS.format(ids=placeholders), ids)
+            cursor.execute(DELETE_ARCHIVED_ALLOCATIONS.format(ids=placeholders), ids)
+            cursor.execute(ARCHIVE_REQUESTS.format(ids=placeholders), ids)
+            cursor.execute(DELETE_ARCHIVED_REQUESTS.format(ids=placeholders), ids)
+            conn.commit()
+            archived += len(ids)
+            print(f"📦 Archived {archived} request(s) created before {cutoff}")
 
         cursor.close()
         conn.close()
 
         return {
-            "resources": resources,
+            "archived": archived,
             "status": "success",
-            "message": f"Found {len(resources)} resource center(s) near disaster ID {request_id}"
+            "message": f"Archived {archived} request(s) created before {cutoff}."
         }
-
     except mysql.connector.Error as err:
+        print(f"Database error: {err}")
         return {
             "error": str(err),
             "results": {}
         }
     except Exception as e:
+        print(f"Unexpected error: {e}")
         return {
             "error": str(e),
             "results": {}
         }
-    
 
-def requests_fetch(location: list[float], disaster_id: int) -> dict:
-    print(f"Fetching requests for disaster ID {disaster_id} near coordinates {location}")
+
+def explain_request_queries(disaster_id: int = 1) -> dict:
+    """
+    EXPLAIN the per-day disaster_requests queries and check that MySQL
+    reads them through REQUESTS_DAY_INDEX instead of scanning the table.
+    """
     try:
-        
-        lat, long = location if len(location) == 2 else (0.0, 0.0)
-        print(f"Fetching requests for disaster ID {disaster_id} near coordinates ({lat}, {long})...")
-        now = datetime.datetime.now()
-        today_start = datetime.datetime.combine(now.date(), datetime.time.min)
-        tomorrow_start = today_start + datetime.timedelta(days=1)
-        print(f"Today's date: {today_start}, Tomorrow's date: {tomorrow_start}")
-
-        conn = mysql.connector.connect(
-            host="localhost",
-            user="root",
-            password="",
-            database="survivorsync"
-        )
+        day_start, day_end = day_range(datetime.datetime.now())
+        queries = {
+            "requests_for_day_after_id": (
+                SELECT_REQUESTS_FOR_DAY_AFTER_ID,
+                (disaster_id, day_start, day_end, 0),
+            ),
+        }
+
+        conn = mysql.connector.connect(**DB_CONFIG)
         cursor = conn.cursor(dictionary=True)
 
-        query = """
-            SELECT * FROM disaster_requests
-            WHERE disasterId = %s
-            AND created_at >= %s AND created_at < %s
-            AND ST_Distance_Sphere(
-                POINT(longitude, latitude),
-                POINT(%s, %s)
-            ) <= 10000
-            """
-
-        cursor.execute(query, (disaster_id, today_start, tomorrow_start, long, lat))
-        disaster_data = cursor.fetchall()
+        plans = {}
+        for name, (query, params) in queries.items():
+            cursor.execute("EXPLAIN " + query, params)
+            plan = cursor.fetchone()
+            plans[name] = {
+                "key": plan.get("key"),
+                "type": plan.get("type"),
+                "rows": plan.get("rows"),
+                "extra": plan.get("Extra"),
+                "uses_index": plan.get("key") == REQUESTS_DAY_INDEX and plan.get("type") == "range",
+            }
 
         cursor.close()
         conn.close()
 
+        ok = all(plan["uses_index"] for plan in plans.values())
         return {
-            "disaster_data": disaster_data,
-            "message": f"Found {len(disaster_data)} requests for disaster ID {disaster_id} near coordinates ({lat}, {long}) on {now.date()}."
+            "plans": plans,
+            "status": "success" if ok else "full_scan",
+            "message": "All day queries use the index." if ok else f"Some day queries do not use {REQUESTS_DAY_INDEX}."
         }
     except mysql.connector.Error as err:
         print(f"Database error: {err}")
         return {
-            "error": f"Database error: {err}"
+            "error": str(err),
+            "results": {}
         }
     except Exception as e:
         print(f"Unexpected error: {e}")
         return {
-            "error": f"Unexpected error: {e}"
+            "error": str(e),
+            "results": {}
         }
 
 
@@ -127,18 +243,12 @@ def update_request_status(request_id: int, status: str):
         return False
 
     try:
-        conn = mysql.connector.connect(
-            host="localhost",
-            user="root",
-            password="",
-            database="survivorsync"
-        )
+        conn = mysql.connector.connect(**DB_CONFIG)
 
         cursor = conn.cursor(dictionary=True)       
 
         # Update query
-        query = "UPDATE disaster_requests SET isVerified = %s WHERE id = %s"
-        cursor.execute(query, (True, request_id))
+        cursor.execute(UPDATE_REQUEST_VERIFIED, (True, request_id))
         conn.commit()
 
         if cursor.rowcount > 0:
@@ -171,17 +281,12 @@ def assign_resources(request_id: int, resource_center_ids: list[int], quantities
     try:
         print(f"Assigning resources to request ID {request_id}...")
 
-        conn = mysql.connector.connect(
-            host="localhost",
-            user="root",
-            password="",
-            database="survivorsync"
-        )
+        conn = mysql.connector.connect(**DB_CONFIG)
 
-        cursor = conn.cursor(dictionary=True)
+        cursor = conn.cursor()
 
         # Check disaster request exists
-        cursor.execute("SELECT * FROM disaster_requests WHERE id = %s", (request_id,))
+        cursor.execute(SELECT_REQUEST_EXISTS, (request_id,))
         disaster = cursor.fetchone()
         if not disaster:
             return {
@@ -192,23 +297,30 @@ def assign_resources(request_id: int, resource_center_ids: list[int], quantities
         # Allocation process
         allocations = []
         for resource_center_id, amount in zip(resource_center_ids, quantities):
+            # Take the stock from the center, all or nothing
+            cursor.execute(RESERVE_STOCK, (amount, resource_center_id, amount))
+            if cursor.rowcount == 0:
+                conn.rollback()
+                cursor.close()
+                conn.close()
+                # Whatever stock the caller planned with is stale, cached or not
+                invalidate(STOCK_CACHE, STOCK_CACHE_KEY)
+                return {
+                    "error": f"Resource center {resource_center_id} does not have {amount} available.",
+                    "conflict_ids": [resource_center_id],
+                    "results": {}
+                }
+
             # Insert into allocated_resources
-            insert_query = """
-                INSERT INTO allocated_resources (disasterRequestId, resourceCenterId, amount, isAllocated)
-                VALUES (%s, %s, %s, %s)
-            """
-            cursor.execute(insert_query, (request_id, resource_center_id, amount, True))
-            allocations.append({
-                "disasterRequestId": request_id,
-                "resourceCenterId": resource_center_id,
-                "amount": amount,
-                "isAllocated": True
-            })
+            cursor.execute(INSERT_ALLOCATION, (request_id, resource_center_id, amount, True))
+            allocations.append(Allocation(request_id, resource_center_id, amount, True))
 
         conn.commit()
         cursor.close()
         conn.close()
 
+        invalidate(STOCK_CACHE, STOCK_CACHE_KEY)
+
         return {
             "results": allocations,
             "status": "success",
@@ -230,6 +342,55 @@ def assign_resources(request_id: int, resource_center_ids: list[int], quantities
 
    
 
+def inventory_fetch() -> dict:
+    """
+    Stock of every resource center for the in-memory inventory ledger.
+    Each row is [id, resourceId, count, used, lat, long].
+    """
+    stock_cache = get_cache(STOCK_CACHE, ttl=STOCK_CACHE_TTL)
+    cached = stock_cache.get(STOCK_CACHE_KEY)
+    if cached is not None:
+        return {
+            "centers": cached,
+            "status": "success",
+            "message": f"Loaded stock for {len(cached)} resource center(s) from the cache."
+        }
+
+    try:
+        conn = mysql.connector.connect(**DB_CONFIG)
+        cursor = conn.cursor()
+
+        cursor.execute(SELECT_INVENTORY)
+        # Plain numbers (no Decimal) so the rows can be shared through the cache
+        centers = [
+            [id, resource_id, int(count or 0), int(used or 0),
+             None if lat is None else float(lat), None if long is None else float(long)]
+            for id, resource_id, count, used, lat, long in cursor.fetchall()
+        ]
+
+        cursor.close()
+        conn.close()
+
+        stock_cache.set(STOCK_CACHE_KEY, centers)
+        return {
+            "centers": centers,
+            "status": "success",
+            "message": f"Loaded stock for {len(centers)} resource center(s)."
+        }
+    except mysql.connector.Error as err:
+        print(f"Database error: {err}")
+        return {
+            "error": str(err),
+            "results": {}
+        }
+    except Exception as e:
+        print(f"Unexpected error: {e}")
+        return {
+            "error": str(e),
+            "results": {}
+        }
+
+
 def change_status_after_assign_resources(request_id: int, status: str) -> dict:
     """
     Change the status of a disaster request.
@@ -237,12 +398,7 @@ def change_status_after_assign_resources(request_id: int, status: str) -> dict:
     try:
         print(f"Changing status of request ID {request_id} to '{status}'...")
 
-        conn = mysql.connector.connect(
-            host="localhost",
-            user="root",
-            password="",
-            database="survivorsync"
-        )
+        conn = mysql.connector.connect(**DB_CONFIG)
         cursor = conn.cursor(dictionary=True)
 
         # Update the disaster request status
@@ -251,8 +407,7 @@ def change_status_after_assign_resources(request_id: int, status: str) -> dict:
                 "error": f"Invalid status '{status}'. Only 'success' allocations are allowed.",
                 "results": {}
             }
-        update_query = "UPDATE disaster_requests SET status = 'IN_PROGRESS' WHERE id = %s"
-        cursor.execute(update_query, (request_id,))
+        cursor.execute(UPDATE_REQUEST_IN_PROGRESS, (request_id,))
         conn.commit()
 
         cursor.close()
@@ -0,0 +1,90 @@
+"""
+Apply the SQL files in db/migrations in order, once each.
+
+    python -m db.migrate                  # apply pending migrations
+    python -m db.migrate --explain        # check the day queries use their index
+    python -m db.migrate --archive-days 2 # move requests older than 2 days to the archive
+"""
+import argparse
+import datetime
+import os
+
+import mysql.connector
+
+from db.db import DB_CONFIG, archive_requests_before, explain_request_queries
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(__file__), "migrations")
+
+CREATE_MIGRATIONS_TABLE = """
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        name VARCHAR(255) PRIMARY KEY,
+        applied_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+    )
+"""
+
+
+def split_statements(sql: str) -> list:
+    # Migrations are plain DDL, one statement per `;`, no procedures
+    lines = [line for line in sql.splitlines() if not line.strip().startswith("--")]
+    return [statement.strip() for statement in "\n".join(lines).split(";") if statement.strip()]
+
+
+def apply_migrations() -> dict:
+    try:
+        conn = mysql.connector.connect(**DB_CONFIG)
+        cursor = conn.cursor()
+
+        cursor.execute(CREATE_MIGRATIONS_TABLE)
+        cursor.execute("SELECT name FROM schema_migrations")
+        applied = {row[0] for row in cursor.fetchall()}
+
+        done = []
+        for name in sorted(os.listdir(MIGRATIONS_DIR)):
+            if not name.endswith(".sql") or name in applied:
+                continue
+            with open(os.path.join(MIGRATIONS_DIR, name), encoding="utf-8") as f:
+                statements = split_statements(f.read())
+
+            print(f"🛠️ Applying {name}...")
+            # DDL commits implicitly in MySQL, so a migration is recorded only
+            # after all of its statements went through
+            for statement in statements:
+                cursor.execute(statement)
+            cursor.execute("INSERT INTO schema_migrations (name) VALUES (%s)", (name,))
+            conn.commit()
+            done.append(name)
+
+        cursor.close()
+        conn.close()
+
+        return {
+            "applied": done,
+            "status": "success",
+            "message": f"Applied {len(done)} migration(s)."
+        }
+    except mysql.connector.Error as err:
+        print(f"Database error: {err}")
+        return {
+            "error": str(err),
+            "results": {}
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--explain", action="store_true", help="EXPLAIN the per-day request queries")
+    parser.add_argument("--archive-days", type=int, help="archive requests older than this many days")
+    args = parser.parse_args()
+    if args.archive_days is not None and args.archive_days < 1:
+        parser.error("--archive-days must be at least 1, today's requests are still in use")
+
+    print(apply_migrations())
+    if args.archive_days is not None:
+        cutoff = datetime.date.today() - datetime.timedelta(days=args.archive_days)
+        print(archive_requests_before(cutoff))
+    if args.explain:
+        print(explain_request_queries())
+
+
+if __name__ == "__main__":
+    main()
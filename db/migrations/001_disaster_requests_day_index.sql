@@ -0,0 +1,14 @@
+-- Access path for the per-day queries on disaster_requests.
+--
+-- The hotspot index (which verification reads) only ever loads one
+-- disaster's requests for the current day with an id above the last one
+-- seen. Leading with disasterId and created_at turns that into a range scan
+-- of a single day, and carrying the coordinates makes the index covering:
+-- InnoDB appends the primary key, so id, latitude and longitude are all
+-- read without touching the rows.
+ALTER TABLE disaster_requests
+    ADD INDEX idx_requests_disaster_day (disasterId, created_at, latitude, longitude);
+
+-- Past days are moved here by db.db.archive_requests_before, which keeps
+-- the live table (and its indexes) about as large as a few days of reports.
+CREATE TABLE IF NOT EXISTS disaster_requests_archive LIKE disaster_requests;
@@ -0,0 +1,12 @@
+-- resource_centers.used is what RESERVE_STOCK checks before every
+-- allocation. Allocations recorded before it was maintained only exist in
+-- allocated_resources, so bring `used` up to at least their sum once. After
+-- this, SELECT_INVENTORY and RESERVE_STOCK read the same column.
+UPDATE resource_centers rc
+LEFT JOIN (
+    SELECT resourceCenterId, SUM(amount) AS allocated
+    FROM allocated_resources
+    WHERE isAllocated = TRUE
+    GROUP BY resourceCenterId
+) a ON a.resourceCenterId = rc.resourceId
+SET rc.used = GREATEST(COALESCE(rc.used, 0), COALESCE(a.allocated, 0));
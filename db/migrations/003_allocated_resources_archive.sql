@@ -0,0 +1,15 @@
+-- Released allocations move here together with their request, see
+-- db.db.archive_requests_before.
+--
+-- Assumes allocated_resources.disasterRequestId references
+-- disaster_requests.id with ON DELETE RESTRICT / NO ACTION (or has no
+-- foreign key at all). The archiver never relies on the delete rule: it
+-- skips requests that still have an allocation with isAllocated = TRUE,
+-- and moves the remaining allocation rows before deleting their request,
+-- all in one transaction. With ON DELETE CASCADE the result is the same,
+-- since nothing is left to cascade to. Stock is unaffected either way:
+-- resource_centers.used is the authoritative count (see migration 002).
+--
+-- LIKE copies columns and indexes but not foreign keys, so archived
+-- allocations may point at archived requests.
+CREATE TABLE IF NOT EXISTS allocated_resources_archive LIKE allocated_resources;
@@ -0,0 +1,24 @@
+from dataclasses import dataclass
+
+# Compact records carried in the workflow state instead of DB row dicts.
+# LangGraph validates and copies the state on every node transition, so
+# these are frozen slotted dataclasses.
+
+
+@dataclass(frozen=True, slots=True)
+class ResourceCenter:
+    id: int
+    resource_id: int
+    count: int
+    used: int
+    lat: float
+    long: float
+    distance: float  # metres from the request
+
+
+@dataclass(frozen=True, slots=True)
+class Allocation:
+    request_id: int
+    resource_center_id: int
+    amount: int
+    is_allocated: bool = True
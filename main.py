@@ -1,5 +1,12 @@
+import os
 from flask import Flask
 from server.gateway_agent import gateway_bp
+from server.asgi_gateway import create_asgi_gateway
+from core.warmup import start_warmup
+
+# Load and compile the workflow in the background as soon as a worker
+# starts, instead of on its first /api/agent request
+WARMUP_WORKFLOW = os.getenv("WARMUP_WORKFLOW", "0") == "1"
 
 def create_app():
     app = Flask(__name__)
@@ -11,8 +18,17 @@ def create_app():
     def home():
         return "Hello, Flask!"
 
+    if WARMUP_WORKFLOW:
+        start_warmup("core.agents")
+
     return app
 
+def create_asgi_app():
+    # Async workflow on an ASGI server, e.g. `uvicorn --factory main:create_asgi_app`
+    if WARMUP_WORKFLOW:
+        start_warmup("core.async_agents")
+    return create_asgi_gateway("Hello, Flask!")
+
 if __name__ == '__main__':
     app = create_app()
     app.run(debug=True)
@@ -0,0 +1,174 @@
+import datetime
+import sys
+from urllib.parse import parse_qs
+
+import orjson
+
+from core.admission import AdmissionRejected, breaker_snapshot
+from core.hotspots import hotspot_index
+from core.cache import cache_stats
+from core.intake import parse_request_message
+from core.inventory import inventory
+from core.scheduler import async_workflow_scheduler
+from core.warmup import warmup_snapshot
+from server.serialization import encode_response, parse_fields, project_fields
+
+# Plain ASGI version of the gateway blueprint for the async workflow.
+# It only needs the handful of JSON routes the Flask app serves, so it is
+# written against the ASGI spec directly instead of pulling in a framework.
+
+
+async def read_body(receive) -> bytes:
+    body = b""
+    more_body = True
+    while more_body:
+        message = await receive()
+        body += message.get("body", b"")
+        more_body = message.get("more_body", False)
+    return body
+
+
+def header(scope, name: bytes):
+    for key, value in scope.get("headers", []):
+        if key.lower() == name:
+            return value.decode("latin-1")
+    return None
+
+
+async def send_json(send, data, status: int = 200, headers: dict = None, scope=None):
+    accept_encoding = header(scope, b"accept-encoding") if scope else None
+    body, response_headers = encode_response(data, accept_encoding)
+    response_headers.update(headers or {})
+    response_headers["Content-Length"] = len(body)
+
+    raw_headers = [
+        (name.lower().encode("latin-1"), str(value).encode("latin-1"))
+        for name, value in response_headers.items()
+    ]
+
+    await send({"type": "http.response.start", "status": status, "headers": raw_headers})
+    await send({"type": "http.response.body", "body": body})
+
+
+async def get_tip(scope, receive, send):
+    tip_data = {
+        "message": "Always comment your code!",
+        "category": "Programming"
+    }
+    await send_json(send, tip_data, 200)
+
+
+async def get_metrics(scope, receive, send):
+    await send_json(send, {
+        "scheduler": async_workflow_scheduler.snapshot(),
+        "circuit_breakers": breaker_snapshot(),
+        "cache": cache_stats(),
+        "inventory": inventory.snapshot(),
+        "warmup": warmup_snapshot()
+    }, 200, scope=scope)
+
+
+def query_param(scope, name: str, default=None):
+    values = parse_qs(scope.get("query_string", b"").decode("latin-1")).get(name)
+    return values[0] if values else default
+
+
+def query_int(scope, name: str, default=None):
+    values = parse_qs(scope.get("query_string", b"").decode("latin-1")).get(name)
+    try:
+        return int(values[0]) if values else default
+    except ValueError:
+        return default
+
+
+async def get_hotspots(scope, receive, send):
+    disaster_id = query_int(scope, "disasterId")
+    min_reports = query_int(scope, "min_reports", 1)
+    await send_json(send, {
+        "date": str(datetime.date.today()),
+        "hotspots": hotspot_index.hotspots(disaster_id, min_reports)
+    }, 200, scope=scope)
+
+
+async def agent_action(scope, receive, send):
+    # Imported here so the Flask-only deployment never loads the async stack
+    from core.async_agents import arun_agent_workflow
+
+    try:
+        form_data = orjson.loads(await read_body(receive) or b"null")
+    except orjson.JSONDecodeError:
+        form_data = None
+    if not isinstance(form_data, dict):
+        await send_json(send, {"error": "Invalid request"}, 400)
+        return
+
+    workflow_input = {
+        "input": form_data,
+    }
+
+    # Severity and size decide the lane; disasterId keeps lanes fair
+    report = parse_request_message(form_data.get("message") or "")
+
+    try:
+        async with async_workflow_scheduler.admit(
+            severity=report["disaster_status"],
+            disaster_id=report["disaster_id"],
+            affected_count=report["affected_count"]
+        ):
+            workflow_result = await arun_agent_workflow(workflow_input)
+    except AdmissionRejected as e:
+        await send_json(send, {"error": str(e), "status": "Server busy"}, 503,
+                        {"Retry-After": e.retry_after})
+        return
+
+    fields = parse_fields(query_param(scope, "fields", ""))
+
+    response_data = {
+        "input": form_data.get("message"),
+        "workflow_result": project_fields(workflow_result, fields),
+        "status": "Agent action processed"
+    }
+    await send_json(send, response_data, 201, scope=scope)
+
+
+ROUTES = {
+    ("GET", "/api/tip"): get_tip,
+    ("GET", "/api/metrics"): get_metrics,
+    ("GET", "/api/hotspots"): get_hotspots,
+    ("POST", "/api/agent"): agent_action,
+}
+
+
+def create_asgi_gateway(home_text: str):
+    async def app(scope, receive, send):
+        if scope["type"] == "lifespan":
+            while True:
+                message = await receive()
+                if message["type"] == "lifespan.startup":
+                    await send({"type": "lifespan.startup.complete"})
+                elif message["type"] == "lifespan.shutdown":
+                    if "core.async_agents" in sys.modules:
+                        await sys.modules["core.async_agents"].close_model_client()
+                    await send({"type": "lifespan.shutdown.complete"})
+                    return
+
+        if scope["type"] != "http":
+            return
+
+        method, path = scope["method"], scope["path"]
+        if method == "GET" and path == "/":
+            body = home_text.encode("utf-8")
+            await send({"type": "http.response.start", "status": 200,
+                        "headers": [(b"content-type", b"text/html; charset=utf-8")]})
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        handler = ROUTES.get((method, path))
+        if handler is None:
+            status = 405 if any(p == path for _, p in ROUTES) else 404
+            await send_json(send, {"error": "Not found" if status == 404 else "Method not allowed"}, status)
+            return
+
+        await handler(scope, receive, send)
+
+    return app
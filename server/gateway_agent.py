@@ -1,6 +1,14 @@
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, Response, jsonify, request
 import uuid
-from core.agents import run_agent_workflow
+import datetime
+from core.admission import AdmissionRejected, breaker_snapshot
+from core.intake import parse_request_message
+from core.scheduler import workflow_scheduler
+from core.hotspots import hotspot_index
+from core.cache import cache_stats
+from core.inventory import inventory
+from core.warmup import warmup_snapshot
+from server.serialization import encode_response, parse_fields, project_fields
 import os
 
 UPLOAD_FOLDER = os.path.join(os.getcwd(), "uploads")
@@ -8,6 +16,13 @@ os.makedirs(UPLOAD_FOLDER, exist_ok=True)  # Create if not exists
 
 gateway_bp = Blueprint('gateway_bp', __name__)
 
+
+def json_response(data, status: int = 200, headers: dict = None) -> Response:
+    # orjson + content-negotiated compression instead of jsonify
+    body, response_headers = encode_response(data, request.headers.get("Accept-Encoding"))
+    response_headers.update(headers or {})
+    return Response(body, status=status, headers=response_headers)
+
 # Endpoint 1: /api/tip
 @gateway_bp.route('/api/tip', methods=['GET'])
 def get_tip():
@@ -17,9 +32,33 @@ def get_tip():
     }
     return jsonify(tip_data), 200
 
+# Endpoint 3: /api/metrics
+@gateway_bp.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    return json_response({
+        "scheduler": workflow_scheduler.snapshot(),
+        "circuit_breakers": breaker_snapshot(),
+        "cache": cache_stats(),
+        "inventory": inventory.snapshot(),
+        "warmup": warmup_snapshot()
+    }, 200)
+
+# Endpoint 4: /api/hotspots
+@gateway_bp.route('/api/hotspots', methods=['GET'])
+def get_hotspots():
+    disaster_id = request.args.get("disasterId", type=int)
+    min_reports = request.args.get("min_reports", default=1, type=int)
+    return json_response({
+        "date": str(datetime.date.today()),
+        "hotspots": hotspot_index.hotspots(disaster_id, min_reports)
+    }, 200)
+
 # Endpoint 2: /api/agent
 @gateway_bp.route('/api/agent', methods=['POST'])
 def agent_action():
+    # Imported on first use so workers start without the workflow stack
+    from core.agents import run_agent_workflow
+
     # For form-data text fields
     form_data = request.get_json()
 
@@ -46,14 +85,31 @@ def agent_action():
         "input": form_data,
     }
 
-    workflow_result = run_agent_workflow(workflow_input)
+    # Severity and size decide the lane; disasterId keeps lanes fair
+    report = parse_request_message(form_data.get("message") or "")
+
+    try:
+        # Gives up with AdmissionRejected if no worker picks the job within
+        # ADMISSION_QUEUE_TIMEOUT, so request threads are not held indefinitely
+        workflow_result = workflow_scheduler.run(
+            run_agent_workflow, workflow_input,
+            severity=report["disaster_status"],
+            disaster_id=report["disaster_id"],
+            affected_count=report["affected_count"]
+        )
+    except AdmissionRejected as e:
+        return json_response({"error": str(e), "status": "Server busy"}, 503,
+                             {"Retry-After": str(e.retry_after)})
+
+    # e.g. /api/agent?fields=user_msg,status,allocated_resources
+    fields = parse_fields(request.args.get("fields", ""))
 
     response_data = {
         "input": form_data.get("message"),
-        "workflow_result": workflow_result,
+        "workflow_result": project_fields(workflow_result, fields),
         "status": "Agent action processed"
     }
-    return jsonify(response_data), 201
+    return json_response(response_data, 201)
 
 
     # data = request.get_json()
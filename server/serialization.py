@@ -0,0 +1,123 @@
+import decimal
+import gzip
+import os
+import threading
+
+import orjson
+
+# Response encoding shared by the Flask and ASGI gateways: orjson for the
+# body, optional `fields=` projection of the workflow result, and gzip/zstd
+# when the client accepts it and the body is worth compressing.
+
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+ZSTD_LEVEL = int(os.getenv("ZSTD_LEVEL", "3"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+
+# Preferred first when the client gives them the same weight
+SUPPORTED_ENCODINGS = ("zstd", "gzip")
+
+# ZstdCompressor objects must not be shared between threads
+_local = threading.local()
+
+
+def _zstd_compressor():
+    compressor = getattr(_local, "zstd", None)
+    if compressor is None:
+        # Imported on the first zstd response to keep worker start-up light
+        import zstandard
+
+        compressor = _local.zstd = zstandard.ZstdCompressor(level=ZSTD_LEVEL)
+    return compressor
+
+
+def _default(obj):
+    # orjson already handles dataclasses (db.records), datetimes and UUIDs
+    if isinstance(obj, decimal.Decimal):
+        return float(obj)
+    if hasattr(obj, "model_dump"):
+        return obj.model_dump()
+    if isinstance(obj, (set, frozenset, tuple)):
+        return list(obj)
+    return str(obj)
+
+
+def dumps(data) -> bytes:
+    return orjson.dumps(data, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+def parse_fields(raw: str) -> list:
+    """`fields=user_msg,status,request.disaster` -> list of field paths."""
+    if not raw:
+        return []
+    return [field.strip() for field in raw.split(",") if field.strip()]
+
+
+def project_fields(result: dict, fields: list) -> dict:
+    """
+    Keep only the requested fields of `result`. Dotted paths reach into
+    nested dictionaries; fields that do not exist are left out.
+    """
+    if not fields or not isinstance(result, dict):
+        return result
+
+    projected = {}
+    for path in fields:
+        source, target = result, projected
+        parts = path.split(".")
+        for i, part in enumerate(parts):
+            if not isinstance(source, dict) or part not in source:
+                break
+            if i == len(parts) - 1:
+                target[part] = source[part]
+            else:
+                source = source[part]
+                target = target.setdefault(part, {})
+    return projected
+
+
+def choose_encoding(accept_encoding: str):
+    """Pick the best supported encoding from an Accept-Encoding header, or None."""
+    if not accept_encoding:
+        return None
+
+    weights = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        name = name.strip().lower()
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[name] = q
+
+    best, best_q = None, 0.0
+    for encoding in SUPPORTED_ENCODINGS:
+        q = weights.get(encoding, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def compress(body: bytes, accept_encoding: str):
+    """Returns (body, content_encoding); content_encoding is None when left as is."""
+    if len(body) < COMPRESS_MIN_BYTES:
+        return body, None
+
+    encoding = choose_encoding(accept_encoding)
+    if encoding == "zstd":
+        return _zstd_compressor().compress(body), "zstd"
+    if encoding == "gzip":
+        return gzip.compress(body, compresslevel=GZIP_LEVEL), "gzip"
+    return body, None
+
+
+def encode_response(data, accept_encoding: str = None):
+    """Serialize and compress a response body. Returns (body, headers)."""
+    body, encoding = compress(dumps(data), accept_encoding)
+    headers = {"Content-Type": "application/json", "Vary": "Accept-Encoding"}
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return body, headers